@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Benchmark the SNMP Location Lookup script against a local mock LibreNMS server
+
+Generates synthetic multi-sheet workbooks, serves a mock of the LibreNMS device API with configurable
+latency, error rate and "not found" ratio, replaces DNS with a stub resolver, and reports rows/sec,
+peak RSS and the time spent in each phase of process_excel_file.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from urllib.parse import unquote, urlparse
+
+from openpyxl import Workbook
+
+import snmp_location_lookup
+
+DOMAIN_SUFFIX = '.bench.local'
+LOCATION_FORMAT = '$B.$C$D.$E'
+SITES = ['CA1', 'CA2', 'CA3', 'VA1', 'TX1']
+
+def device_name(index):
+    """
+    Build the name of a synthetic device
+
+    Args:
+        index (int): Number of the device
+
+    Returns:
+        str: Device name without the domain suffix
+    """
+    return f"BENCH-SW-{index:06d}"
+
+def device_index(hostname):
+    """
+    Get the number of a synthetic device from its hostname
+
+    Args:
+        hostname (str): Device hostname, with or without the domain suffix
+
+    Returns:
+        int: Number of the device, or None if the hostname is not a synthetic device
+    """
+    name = hostname.split('.', 1)[0].upper()
+    if not name.startswith('BENCH-SW-'):
+        return None
+    try:
+        return int(name[len('BENCH-SW-'):])
+    except ValueError:
+        return None
+
+def device_columns(index):
+    """
+    Build the location columns of a synthetic device
+
+    Args:
+        index (int): Number of the device
+
+    Returns:
+        list: Site, room, row and rack values matching LOCATION_FORMAT
+    """
+    return [SITES[index % len(SITES)], 'R', f"{index % 40:02d}", f"RACK{index % 25:02d}"]
+
+def is_missing(index, not_found_ratio):
+    """
+    Decide whether a synthetic device is unknown to the mock server; stable across runs
+
+    Args:
+        index (int): Number of the device
+        not_found_ratio (float): Fraction of devices that are not in LibreNMS
+
+    Returns:
+        bool: True if the device is not in LibreNMS
+    """
+    return zlib.crc32(device_name(index).encode()) % 10000 < not_found_ratio * 10000
+
+def device_record(index):
+    """
+    Build the LibreNMS record of a synthetic device; every tenth device has a stale location
+
+    Args:
+        index (int): Number of the device
+
+    Returns:
+        dict: Device record as returned by the LibreNMS API
+    """
+    site, room, row, rack = device_columns(index)
+    location = f"{site}.{room}{row}.{rack}" if index % 10 else f"{site}.OLD.{rack}"
+    return {
+        'device_id': index + 1,
+        'hostname': f"{device_name(index).lower()}{DOMAIN_SUFFIX}",
+        'ip': f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}",
+        'sysDescr': 'Cisco IOS Software, C9300 Software (CAT9K_IOSXE), Version 17.9.4',
+        'hardware': 'C9300-48P',
+        'os': 'iosxe',
+        'version': '17.9.4',
+        'last_polled': '2026-10-01 00:00:00',
+        'location': location,
+    }
+
+def generate_workbook(path, rows, sheets=4, unique_devices=None):
+    """
+    Write a synthetic audit workbook
+
+    Args:
+        path (str): Path of the workbook to create
+        rows (int): Total number of device rows, spread evenly across the sheets
+        sheets (int): Number of sheets
+        unique_devices (int): Number of distinct devices referenced by the rows (default: one per row)
+    """
+    unique_devices = unique_devices or rows
+    workbook = Workbook(write_only=True)
+    per_sheet, remainder = divmod(rows, sheets)
+    row_number = 0
+    for sheet in range(sheets):
+        worksheet = workbook.create_sheet(f"IDF {sheet + 1}")
+        worksheet.append(['Device Name', 'Site', 'Room', 'Row', 'Rack', 'Notes'])
+        for _ in range(per_sheet + (1 if sheet < remainder else 0)):
+            index = row_number % unique_devices
+            worksheet.append([device_name(index)] + device_columns(index) + [''])
+            row_number += 1
+    workbook.save(path)
+
+class MockLibreNMSHandler(BaseHTTPRequestHandler):
+    """Serves /api/v0/devices and /api/v0/devices/{hostname} for synthetic devices"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY keep-alive responses stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and random.random() < server.error_rate:
+            return self.send_json(503, {'status': 'error', 'message': 'Service Unavailable'})
+
+        path = urlparse(self.path).path.rstrip('/')
+        if path == '/api/v0/devices':
+            devices = [device_record(index) for index in range(server.devices)
+                       if not is_missing(index, server.not_found_ratio)]
+            return self.send_json(200, {'status': 'ok', 'count': len(devices), 'devices': devices})
+        if path.startswith('/api/v0/devices/'):
+            index = device_index(unquote(path.rsplit('/', 1)[1]))
+            if index is None or index >= server.devices or is_missing(index, server.not_found_ratio):
+                return self.send_json(404, {'status': 'error', 'message': 'Device does not exist'})
+            return self.send_json(200, {'status': 'ok', 'count': 1, 'devices': [device_record(index)]})
+        self.send_json(404, {'status': 'error', 'message': 'Not found'})
+
+class MockLibreNMSServer:
+    """Local mock of the LibreNMS device API, running in a background thread"""
+
+    def __init__(self, devices, latency=0.0, error_rate=0.0, not_found_ratio=0.1):
+        """
+        Initialize the mock server
+
+        Args:
+            devices (int): Number of synthetic devices the server knows about
+            latency (float): Seconds added to every response
+            error_rate (float): Fraction of requests answered with 503 Service Unavailable
+            not_found_ratio (float): Fraction of devices answered with 404 Not Found
+        """
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), MockLibreNMSHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.devices = devices
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.not_found_ratio = not_found_ratio
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def stub_dns_lookup(hostname, latency=0.0):
+    """
+    Stand-in for perform_dns_lookup that answers without touching the network
+
+    Args:
+        hostname (str): Hostname to lookup
+        latency (float): Seconds to wait before answering
+
+    Returns:
+        tuple: (IP address, status message, IPv6 addresses)
+    """
+    if latency:
+        time.sleep(latency)
+    if zlib.crc32(hostname.lower().encode()) % 2:
+        return None, "Not found in DNS", None
+    index = device_index(hostname) or 0
+    return f"10.254.{index >> 8 & 255}.{index & 255}", "Found in DNS", None
+
+def peak_rss_mb():
+    """
+    Get the peak resident set size of the current process
+
+    Returns:
+        float: Peak RSS in megabytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_case(excel_path, api_url, rows, options):
+    """
+    Run process_excel_file once on a generated workbook; called in a fresh process so peak RSS is per run
+
+    Args:
+        excel_path (str): Path to the generated workbook
+        api_url (str): URL of the mock LibreNMS server
+        rows (int): Number of device rows in the workbook
+        options (dict): Benchmark options (bulk, workers, dns_workers, dns_latency, write_only, excel_engine,
+                        processes)
+
+    Returns:
+        dict: Rows, elapsed seconds, rows/sec, peak RSS and per-phase seconds
+    """
+    snmp_location_lookup.configure_logging('WARNING')
+    dns_latency = options['dns_latency']
+    snmp_location_lookup.perform_dns_lookup = lambda hostname: stub_dns_lookup(hostname, dns_latency)
+
+    timings = snmp_location_lookup.RunTimings()
+    start = time.perf_counter()
+    snmp_location_lookup.process_excel_file(
+        excel_path, api_url, 'benchmark-token', LOCATION_FORMAT, domain_suffix=DOMAIN_SUFFIX,
+        bulk=options['bulk'], workers=options['workers'], retries=options['retries'],
+        dns_workers=options['dns_workers'], write_only=options['write_only'],
+        excel_engine=options['excel_engine'], processes=options['processes'], timings=timings)
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows / elapsed, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'phases': {name: round(seconds, 3) for name, seconds in timings.phases.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the SNMP Location Lookup script against a mock LibreNMS server')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000],
+                        help='Workbook sizes to benchmark, in device rows (default: 1000 10000)')
+    parser.add_argument('--sheets', type=int, default=4, help='Number of sheets per workbook (default: 4)')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0,
+                        help='Fraction of rows that repeat a device from another row (default: 0)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds the mock server adds to every response (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of API requests answered with 503 (default: 0)')
+    parser.add_argument('--not-found-ratio', type=float, default=0.1,
+                        help='Fraction of devices unknown to the mock server (default: 0.1)')
+    parser.add_argument('--dns-latency', type=float, default=0.0,
+                        help='Seconds the stub DNS resolver waits per lookup (default: 0)')
+    parser.add_argument('--bulk', action='store_true', help='Benchmark the bulk inventory lookup')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent API requests (default: 8)')
+    parser.add_argument('--retries', type=int, default=3, help='Number of retries for 503 responses (default: 3)')
+    parser.add_argument('--dns-workers', type=int, default=10, help='Number of concurrent DNS lookups (default: 10)')
+    parser.add_argument('--write-only', action='store_true', help='Benchmark the write-only output mode')
+    parser.add_argument('--excel-engine', choices=['openpyxl', 'calamine'], default=None,
+                        help='Engine used to read the workbook (default: openpyxl)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Number of worker processes for reading sheets (default: 1)')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    options = {
+        'bulk': args.bulk,
+        'workers': args.workers,
+        'retries': args.retries,
+        'dns_workers': args.dns_workers,
+        'dns_latency': args.dns_latency,
+        'write_only': args.write_only,
+        'excel_engine': args.excel_engine,
+        'processes': args.processes,
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            unique_devices = max(1, round(rows * (1 - args.duplicate_ratio)))
+            excel_path = os.path.join(workdir, f"bench_{rows}.xlsx")
+            print(f"Generating workbook with {rows} rows ({unique_devices} unique devices, {args.sheets} sheets)...")
+            generate_workbook(excel_path, rows, args.sheets, unique_devices)
+
+            with MockLibreNMSServer(unique_devices, args.latency, args.error_rate, args.not_found_ratio) as server:
+                # A fresh process per run keeps peak RSS from carrying over between workbook sizes
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                    result = executor.submit(run_case, excel_path, server.url, rows, options).result()
+            results.append(result)
+
+            print(f"  {result['rows_per_sec']:.1f} rows/sec, {result['seconds']:.2f}s total, "
+                  f"peak RSS {result['peak_rss_mb']:.1f} MB")
+            for name, seconds in result['phases'].items():
+                print(f"    {name}: {seconds:.3f}s")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'options': {**options, 'sheets': args.sheets, 'latency': args.latency,
+                                   'error_rate': args.error_rate, 'not_found_ratio': args.not_found_ratio,
+                                   'duplicate_ratio': args.duplicate_ratio},
+                       'results': results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+if __name__ == "__main__":
+    main()
@@ -10,177 +10,2354 @@ import os
 import sys
 import json
 import re
+import shutil
+import signal
 import argparse
+import asyncio
+import difflib
+import logging
 import requests
+import numpy as np
 import pandas as pd
 import socket
-import subprocess
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import CellIsRule, FormulaRule
+from openpyxl.styles import PatternFill, Font
+from openpyxl.utils import get_column_letter
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
 from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
 
 # Suppress only the specific InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+logger = logging.getLogger('snmp_location_lookup')
+
+# Default location of the persistent device cache
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'snmp_location_lookup', 'devices.sqlite')
+DEFAULT_SNAPSHOT_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'snmp_location_lookup', 'snapshot.sqlite')
+
+# Fields compared against the previous run's snapshot to decide whether a device changed
+DELTA_FIELDS = ['hostname', 'last_polled', 'location']
+
+# Seconds a DNS lookup may take before it is reported as timed out
+DNS_TIMEOUT = 5
+
+# Device fields copied from the API response into the Excel sheet
+DEVICE_FIELDS = ['hostname', 'ip', 'sysDescr', 'hardware', 'os', 'version', 'last_polled', 'location']
+
+# Columns added to each audited sheet
+MATCH_COLUMNS = ['Match', 'Match_Score', 'Location_Diff']
+# Values of the enum-like result columns, stored as categoricals
+STATUS_VALUES = ['Found', 'Not found in LibreNMS']
+COMPLIANT_VALUES = ['Yes', 'No']
+MATCH_CLASSES = ['exact', 'normalized', 'reordered', 'fuzzy', 'mismatch']
+RESULT_COLUMNS = DEVICE_FIELDS + ['Expected_Location', 'Compliant'] + MATCH_COLUMNS + ['Status', 'DNS_IP', 'DNS_IPv6', 'DNS_Status']
+
+# Supported input/output file formats by extension
+FILE_FORMATS = {
+    '.xlsx': 'excel',
+    '.xlsm': 'excel',
+    '.xls': 'excel',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+# Excel styles
+HEADER_FILL = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+COMPLIANT_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+NON_COMPLIANT_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+NOT_FOUND_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+TOTAL_FILL = PatternFill(start_color="DCE6F1", end_color="DCE6F1", fill_type="solid")
+TOTAL_FONT = Font(bold=True)
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as one JSON object per line"""
+    
+    # Attributes every LogRecord has; anything else was passed through extra=
+    STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+    
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'message': record.getMessage().strip(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level='INFO', json_format=False):
+    """
+    Send log output to stdout, as plain messages or as JSON lines
+    
+    Args:
+        level (str): Minimum level to log (DEBUG, INFO, WARNING or ERROR)
+        json_format (bool): Log one JSON object per line instead of plain messages
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter('%(message)s'))
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+class RunTimings:
+    """Collects per-phase durations and request latencies for the end-of-run timing report"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.latencies = {}
+    
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase of the run; repeated phases with the same name are added up
+        
+        Args:
+            name (str): Name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+    
+    def add_latency(self, name, seconds):
+        """
+        Record the latency of a single request
+        
+        Args:
+            name (str): Kind of request (e.g., API request, DNS lookup)
+            seconds (float): Duration of the request
+        """
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+    
+    def report(self):
+        """Log the time spent in each phase and the latency percentiles of each kind of request"""
+        logger.info("\nTiming report:")
+        for name, elapsed in self.phases.items():
+            logger.info(f"  {name}: {elapsed:.3f}s", extra={'phase': name, 'seconds': round(elapsed, 6)})
+        for name, samples in self.latencies.items():
+            samples = sorted(samples)
+            percentiles = {f"p{p}": samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in (50, 95, 99)}
+            logger.info(f"  {name} latency ({len(samples)} requests): " +
+                        ', '.join(f"{key}={value * 1000:.1f}ms" for key, value in percentiles.items()),
+                        extra={'latency': name, 'count': len(samples),
+                               **{key: round(value, 6) for key, value in percentiles.items()}})
+
+class RateLimiter:
+    """Thread-safe token bucket limiting the number of requests per second"""
+    
+    def __init__(self, rate, burst=None):
+        """
+        Initialize the rate limiter
+        
+        Args:
+            rate (float): Number of requests allowed per second
+            burst (int): Maximum number of requests allowed at once (default: one second worth)
+        """
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into a single call whose result is shared"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+    
+    def do(self, key, function, *args):
+        """
+        Call function(*args), unless a call for the same key is already running
+        
+        Args:
+            key (str): Key identifying the call
+            function (callable): Function to call
+            
+        Returns:
+            The result of the call, shared by every caller waiting on the same key
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'done': threading.Event(), 'result': None}
+        
+        if not leader:
+            call['done'].wait()
+            return call['result']
+        
+        try:
+            call['result'] = function(*args)
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
+        return call['result']
+
+class DeviceCache:
+    """Persistent SQLite cache of LibreNMS device records keyed by FQDN"""
+    
+    def __init__(self, path, ttl, negative_ttl=300, refresh=False):
+        """
+        Open (or create) the device cache
+        
+        Args:
+            path (str): Path to the SQLite cache file
+            ttl (float): Number of seconds a cached device record stays valid
+            negative_ttl (float): Number of seconds a cached "not found" result stays valid
+            refresh (bool): Ignore cached records and only store fresh results
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        
+        cache_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS devices ('
+                          'hostname TEXT PRIMARY KEY, data TEXT, fetched_at REAL NOT NULL)')
+        self.conn.commit()
+    
+    def get(self, hostname):
+        """
+        Look up a device in the cache
+        
+        Args:
+            hostname (str): FQDN of the device
+            
+        Returns:
+            tuple: (hit, device) where device is None for a cached "not found" result
+        """
+        if self.refresh:
+            return False, None
+        
+        with self.lock:
+            row = self.conn.execute('SELECT data, fetched_at FROM devices WHERE hostname = ?',
+                                    (hostname.strip().lower(),)).fetchone()
+        if row is None:
+            return False, None
+        
+        data, fetched_at = row
+        age = time.time() - fetched_at
+        if data is None:
+            return (True, None) if age < self.negative_ttl else (False, None)
+        if age >= self.ttl:
+            return False, None
+        return True, json.loads(data)
+    
+    def set(self, hostname, device):
+        """
+        Store a device record, or a "not found" result when device is None
+        
+        Args:
+            hostname (str): FQDN of the device
+            device (dict): Device information from the API, or None if not found
+        """
+        self.set_many([(hostname, device)])
+    
+    def set_many(self, items):
+        """
+        Store several device records in a single transaction
+        
+        Args:
+            items (iterable): (hostname, device) pairs
+        """
+        now = time.time()
+        rows = [(hostname.strip().lower(), json.dumps(device) if device is not None else None, now)
+                for hostname, device in items]
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO devices (hostname, data, fetched_at) VALUES (?, ?, ?)', rows)
+            self.conn.commit()
+    
+    def close(self):
+        """Close the cache file"""
+        with self.lock:
+            self.conn.close()
+
+class DeviceSnapshot:
+    """Device records from previous runs with the fields used to detect changes, for delta runs"""
+    
+    def __init__(self, path):
+        """
+        Open (or create) the snapshot
+        
+        Args:
+            path (str): Path to the SQLite snapshot file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        
+        snapshot_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS devices ('
+                          'hostname TEXT PRIMARY KEY, data TEXT NOT NULL, last_polled TEXT, location TEXT)')
+        self.conn.commit()
+    
+    def load(self):
+        """
+        Load the change markers of every device in the snapshot
+        
+        Returns:
+            dict: (last_polled, location) for each hostname
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT hostname, last_polled, location FROM devices').fetchall()
+        return {hostname: (last_polled, location) for hostname, last_polled, location in rows}
+    
+    def get_many(self, hostnames):
+        """
+        Load the stored records of several devices
+        
+        Args:
+            hostnames (list): Hostnames of the devices
+            
+        Returns:
+            dict: Device information for each hostname found in the snapshot
+        """
+        records = {}
+        hostnames = list(hostnames)
+        with self.lock:
+            # Stay under SQLite's limit on the number of query parameters
+            for start in range(0, len(hostnames), 500):
+                batch = hostnames[start:start + 500]
+                rows = self.conn.execute(f"SELECT hostname, data FROM devices WHERE hostname IN "
+                                         f"({', '.join('?' * len(batch))})", batch).fetchall()
+                records.update((hostname, json.loads(data)) for hostname, data in rows)
+        return records
+    
+    def save_many(self, items):
+        """
+        Store the latest records of several devices in a single transaction
+        
+        Args:
+            items (iterable): (hostname, device) pairs
+        """
+        rows = [(hostname.strip().lower(), json.dumps(device), str(device.get('last_polled', '')),
+                 str(device.get('location', ''))) for hostname, device in items if device]
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO devices (hostname, data, last_polled, location) '
+                                  'VALUES (?, ?, ?, ?)', rows)
+            self.conn.commit()
+    
+    def close(self):
+        """Close the snapshot file"""
+        with self.lock:
+            self.conn.close()
+
+class CheckpointJournal:
+    """Journal of completed device lookups, used to resume an interrupted run or re-run incrementally"""
+    
+    def __init__(self, path, keep=False):
+        """
+        Open the journal
+        
+        Args:
+            path (str): Path to the journal file
+            keep (bool): Keep the records of previous runs instead of starting a new journal
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.records = {}
+        
+        if keep and os.path.exists(path):
+            with open(path) as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A run that was killed mid-write can leave a truncated last line
+                        continue
+                    self.records.setdefault(record['sheet'], {})[record['row']] = record
+        
+        # Rewrite the journal with only the latest record for each row
+        self.file = open(path, 'w')
+        for sheet_records in self.records.values():
+            for record in sheet_records.values():
+                self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+    
+    def sheet_records(self, sheet_name):
+        """
+        Get the journaled lookups for a sheet
+        
+        Args:
+            sheet_name (str): Name of the sheet
+            
+        Returns:
+            dict: Latest journal record for each row index
+        """
+        return self.records.get(sheet_name, {})
+    
+    def record(self, sheet_name, row, hostname, expected_location, device):
+        """
+        Record a completed lookup for a row
+        
+        Args:
+            sheet_name (str): Name of the sheet
+            row (int): Row index in the sheet
+            hostname (str): Full hostname that was looked up
+            expected_location (str): Expected location of the row when it was looked up
+            device (dict): Device information from the API, or None if not found
+        """
+        record = {'sheet': sheet_name, 'row': row, 'hostname': hostname,
+                  'expected': expected_location, 'device': device}
+        with self.lock:
+            self.records.setdefault(sheet_name, {})[row] = record
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+    
+    def close(self):
+        """Close the journal file"""
+        with self.lock:
+            self.file.close()
+
+class ApplyJournal:
+    """Append-only journal of the location updates pushed to LibreNMS"""
+    
+    def __init__(self, path):
+        """
+        Open the journal, keeping the records of previous runs
+        
+        Args:
+            path (str): Path to the journal file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a')
+    
+    def record(self, hostname, old_location, new_location, status, message=''):
+        """
+        Record the outcome of a location update
+        
+        Args:
+            hostname (str): Hostname of the device
+            old_location (str): Location before the update
+            new_location (str): Location that was (or would be) set
+            status (str): updated, failed, skipped or dry-run
+            message (str): Response message or reason
+        """
+        record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'hostname': hostname, 'old': old_location,
+                  'new': new_location, 'status': status, 'message': message}
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+    
+    def close(self):
+        """Close the journal file"""
+        with self.lock:
+            self.file.close()
+
 class LibreNMSClient:
     """Client for interacting with the LibreNMS API"""
     
-    def __init__(self, api_url, api_token, verify_ssl=False):
+    def __init__(self, api_url, api_token, verify_ssl=False, rate_limit=None, pool_size=10, retries=3,
+                 backoff_factor=0.5, connect_timeout=5, read_timeout=30, cache=None, snapshot=None, timings=None):
         """
         Initialize the LibreNMS API client
         
-        Args:
-            api_url (str): Base URL for the LibreNMS API
-            api_token (str): API token for authentication
-            verify_ssl (bool): Whether to verify SSL certificates
-        """
-        self.api_url = api_url.rstrip('/')
-        self.headers = {'X-Auth-Token': api_token}
-        self.verify_ssl = verify_ssl
+        Args:
+            api_url (str): Base URL for the LibreNMS API
+            api_token (str): API token for authentication
+            verify_ssl (bool): Whether to verify SSL certificates
+            rate_limit (float): Maximum number of API requests per second (default: unlimited)
+            pool_size (int): Maximum number of pooled connections kept open to the API server
+            retries (int): Number of retries for connection errors and 429/5xx responses
+            backoff_factor (float): Base delay in seconds for exponential backoff between retries
+            connect_timeout (float): Timeout in seconds for establishing a connection
+            read_timeout (float): Timeout in seconds for reading a response
+            cache (DeviceCache): Persistent cache of device records (default: no cache)
+            snapshot (DeviceSnapshot): Snapshot of the previous run used by delta runs (default: no snapshot)
+            timings (RunTimings): Collector for API request latencies (default: not recorded)
+        """
+        self.api_url = api_url.rstrip('/')
+        self.headers = {'X-Auth-Token': api_token}
+        self.verify_ssl = verify_ssl
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.cache = cache
+        self.snapshot = snapshot
+        self.timings = timings
+        self.device_index = None
+        self.unchanged_index = None
+        self.single_flight = SingleFlight()
+        
+        # Reuse connections across requests and retry transient failures with backoff
+        # (location updates are idempotent, so PATCH is retried like GET)
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {'PATCH'},
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.verify = verify_ssl
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def close(self):
+        """Close the pooled connections to the API server, the device cache and the snapshot"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+    
+    def prefetch_devices(self, fields=None):
+        """
+        Fetch the whole device inventory in one request and index it by hostname
+        
+        After a successful prefetch, get_device_info answers from the local index
+        and only falls back to the per-host endpoint for hostnames missing from it.
+        
+        Args:
+            fields (list): Device fields to request and keep in the index (default: all fields)
+            
+        Returns:
+            int: Number of devices indexed, or None if the inventory could not be fetched
+        """
+        devices = self._list_devices({'columns': ','.join(fields)} if fields else None)
+        if devices is None:
+            return None
+        
+        device_index = {}
+        for device in devices:
+            hostname = device.get('hostname')
+            if not hostname:
+                continue
+            if fields:
+                device = {field: device.get(field, '') for field in fields}
+            device_index[str(hostname).strip().lower()] = device
+        
+        self.device_index = device_index
+        if self.cache is not None:
+            self.cache.set_many(device_index.items())
+        if self.snapshot is not None:
+            self.snapshot.save_many(device_index.items())
+        return len(device_index)
+    
+    def prepare_delta(self):
+        """
+        Compare the change markers of every device with the snapshot of the previous run
+        
+        Only the DELTA_FIELDS of the inventory are requested. Afterwards get_device_info answers
+        devices whose last_polled and location did not change from the snapshot, and only
+        queries the API for new or changed devices.
+        
+        Returns:
+            tuple: (number of unchanged devices, number of new or changed devices), or None if the
+                   inventory could not be fetched
+        """
+        devices = self._list_devices({'columns': ','.join(DELTA_FIELDS)})
+        if devices is None:
+            return None
+        
+        previous = self.snapshot.load()
+        unchanged = []
+        listed = 0
+        for device in devices:
+            hostname = device.get('hostname')
+            if not hostname:
+                continue
+            listed += 1
+            hostname = str(hostname).strip().lower()
+            markers = (str(device.get('last_polled', '')), str(device.get('location', '')))
+            if previous.get(hostname) == markers:
+                unchanged.append(hostname)
+        
+        self.unchanged_index = self.snapshot.get_many(unchanged)
+        return len(self.unchanged_index), listed - len(self.unchanged_index)
+    
+    def _list_devices(self, params=None):
+        url = f"{self.api_url}/api/v0/devices"
+        try:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            response = self.session.get(url, params=params,
+                                        timeout=(self.connect_timeout, max(self.read_timeout, 300)))
+            if response.status_code != 200:
+                logger.warning(f"  API returned status code {response.status_code} for device inventory")
+                return None
+            data = response.json()
+            if data.get('status') != 'ok':
+                logger.warning("  API returned no device inventory")
+                return None
+            return data.get('devices') or []
+        except requests.exceptions.Timeout:
+            logger.error("Error: API request timed out for device inventory")
+            return None
+        except requests.exceptions.ConnectionError:
+            logger.error(f"Error: Could not connect to API server at {self.api_url}")
+            return None
+        except Exception as e:
+            logger.error(f"Error querying API for device inventory: {str(e)}")
+            return None
+    
+    def get_device_info(self, hostname):
+        """
+        Get device information from the LibreNMS API
+        
+        Concurrent calls for the same hostname share a single API request.
+        
+        Args:
+            hostname (str): Hostname of the device to query
+            
+        Returns:
+            dict: Device information or None if not found
+        """
+        return self.single_flight.do(hostname.strip().lower(), self._get_device_info, hostname)
+    
+    def _get_device_info(self, hostname):
+        if self.unchanged_index is not None:
+            device = self.unchanged_index.get(hostname.strip().lower())
+            if device is not None:
+                return device
+        
+        if self.device_index is not None:
+            device = self.device_index.get(hostname.strip().lower())
+            if device is not None:
+                return device
+        
+        if self.cache is not None:
+            hit, device = self.cache.get(hostname)
+            if hit:
+                return device
+        
+        url = f"{self.api_url}/api/v0/devices/{hostname}"
+        try:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            start = time.perf_counter()
+            response = self.session.get(url, timeout=(self.connect_timeout, self.read_timeout))
+            if self.timings:
+                self.timings.add_latency('API request', time.perf_counter() - start)
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('status') == 'ok' and data.get('devices') and len(data['devices']) > 0:
+                    if self.cache is not None:
+                        self.cache.set(hostname, data['devices'][0])
+                    if self.snapshot is not None:
+                        self.snapshot.save_many([(hostname, data['devices'][0])])
+                    return data['devices'][0]
+                else:
+                    logger.debug(f"  API returned no device data for {hostname}")
+            elif response.status_code == 404:
+                logger.debug(f"  Device not found in LibreNMS: {hostname}", extra={'hostname': hostname})
+                if self.cache is not None:
+                    self.cache.set(hostname, None)
+            else:
+                logger.warning(f"  API returned status code {response.status_code} for {hostname}",
+                               extra={'hostname': hostname, 'status_code': response.status_code})
+                if response.status_code == 401:
+                    logger.error("  Authentication error. Check your API token.")
+            return None
+        except requests.exceptions.Timeout:
+            logger.error(f"Error: API request timed out for {hostname}")
+            return None
+        except requests.exceptions.RetryError:
+            logger.error(f"Error: API request for {hostname} failed after retries")
+            return None
+        except requests.exceptions.ConnectionError:
+            logger.error(f"Error: Could not connect to API server at {self.api_url}")
+            return None
+        except Exception as e:
+            logger.error(f"Error querying API for {hostname}: {str(e)}")
+            return None
+
+    def update_device_location(self, hostname, location, device=None):
+        """
+        Set the location of a device in LibreNMS, overriding the sysLocation reported over SNMP
+        
+        Args:
+            hostname (str): Hostname of the device
+            location (str): New location
+            device (dict): Current device information, refreshed in the cache and snapshot on success
+            
+        Returns:
+            tuple: (True if the device was updated, response message or error)
+        """
+        url = f"{self.api_url}/api/v0/devices/{hostname}"
+        # Without override_sysLocation the next poll would overwrite the location again
+        body = {'field': ['location', 'override_sysLocation'], 'data': [location, 1]}
+        try:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            start = time.perf_counter()
+            response = self.session.patch(url, json=body, timeout=(self.connect_timeout, self.read_timeout))
+            if self.timings:
+                self.timings.add_latency('API update', time.perf_counter() - start)
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            if response.status_code == 200 and data.get('status') == 'ok':
+                if device is not None:
+                    device = {**device, 'location': location}
+                    if self.cache is not None:
+                        self.cache.set(hostname, device)
+                    if self.snapshot is not None:
+                        self.snapshot.save_many([(hostname, device)])
+                return True, data.get('message', 'updated')
+            if response.status_code == 401:
+                logger.error("  Authentication error. Check your API token.")
+            return False, f"status code {response.status_code}: {data.get('message', response.reason)}"
+        except requests.exceptions.Timeout:
+            return False, "request timed out"
+        except requests.exceptions.RetryError:
+            return False, "failed after retries"
+        except requests.exceptions.ConnectionError:
+            return False, f"could not connect to API server at {self.api_url}"
+        except Exception as e:
+            return False, str(e)
+
+def normalize_hostname(device_name, domain_suffix):
+    """
+    Build the fully qualified hostname of a device
+    
+    Args:
+        device_name (str): Device name from the Excel file
+        domain_suffix (str): Domain suffix to append to hostnames
+        
+    Returns:
+        str: Device name as is if it already has a domain, otherwise with the domain suffix appended
+    """
+    device_name = device_name.strip()
+    if '.' in device_name:
+        return device_name
+    return f"{device_name}{domain_suffix}"
+
+def build_full_hostnames(device_names, domain_suffix):
+    """
+    Build the fully qualified hostnames for a column of device names
+    
+    Args:
+        device_names (pandas.Series): Device names from the Excel file
+        domain_suffix (str): Domain suffix to append to hostnames
+        
+    Returns:
+        pandas.Series: Full hostname for each row with a device name, indexed like device_names
+    """
+    names = device_names.astype(str).str.strip().where(device_names.notna(), '')
+    names = names[names != ''].astype(object)
+    
+    # Names that already have a domain are used as is
+    has_domain = names.str.contains('.', regex=False)
+    return names.where(has_domain, names + domain_suffix)
+
+def column_index(col_ref):
+    """
+    Convert an Excel column reference to a zero-based column index
+    
+    Args:
+        col_ref (str): Column letters (e.g., B or AA)
+        
+    Returns:
+        int: Zero-based column index (A=0, Z=25, AA=26)
+    """
+    index = 0
+    for letter in col_ref:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+    return index - 1
+
+def compile_location_template(format_template, df_columns):
+    """
+    Compile a location format template into a plan of literal text and column positions
+    
+    Args:
+        format_template (str): Format template with column references (e.g., $B.$C$E.$F)
+        df_columns (list): List of column names from the DataFrame
+        
+    Returns:
+        list: (is_column, value) pairs, where value is a column position or literal text
+    """
+    plan = []
+    position = 0
+    
+    # Find all column references (e.g., $B, $C, $AA, etc.)
+    for match in re.finditer(r'\$([A-Z]+)', format_template):
+        if match.start() > position:
+            plan.append((False, format_template[position:match.start()]))
+        position = match.end()
+        
+        col_ref = match.group(1)
+        col_idx = column_index(col_ref)
+        
+        # Check if the column index is valid
+        if col_idx >= len(df_columns):
+            logger.warning(f"Warning: Column {col_ref} (index {col_idx}) is out of range. Available columns: {len(df_columns)}")
+            # Leave the reference out to avoid template syntax in output
+            continue
+        
+        plan.append((True, col_idx))
+    
+    if position < len(format_template):
+        plan.append((False, format_template[position:]))
+    
+    return plan
+
+def clean_location(location):
+    """
+    Remove the periods left behind by empty values in a location string
+    
+    Args:
+        location (str): Location string built from a format template
+        
+    Returns:
+        str: Cleaned location string
+    """
+    location = re.sub(r'\.\s*\.', '.', location)
+    return re.sub(r'^\.|\.$', '', location)  # Remove leading/trailing periods
+
+def build_expected_location(row, df_columns, format_template):
+    """
+    Build the expected location string from row data and format template
+    
+    Args:
+        row (pandas.Series): Row data from Excel
+        df_columns (list): List of column names from the DataFrame
+        format_template (str): Format template with column references (e.g., $B.$C$E.$F)
+        
+    Returns:
+        str: Expected location string
+    """
+    if not format_template:
+        return None
+    
+    return render_location(compile_location_template(format_template, df_columns), row.tolist())
+
+def render_location(plan, values):
+    """
+    Build a location string from a compiled template plan
+    
+    Args:
+        plan (list): Plan returned by compile_location_template
+        values (list): Values of the row, in column order
+        
+    Returns:
+        str: Location string
+    """
+    parts = []
+    for is_column, value in plan:
+        if not is_column:
+            parts.append(value)
+        elif not pd.isna(values[value]):
+            # Convert to string and strip whitespace
+            parts.append(str(values[value]).strip())
+    
+    return clean_location(''.join(parts))
+
+def build_expected_locations(df, format_template):
+    """
+    Build the expected location strings for every row of a sheet at once
+    
+    Args:
+        df (pandas.DataFrame): Sheet data from Excel
+        format_template (str): Format template with column references (e.g., $B.$C$E.$F)
+        
+    Returns:
+        pandas.Series: Expected location string for each row, or None if there is no template
+    """
+    if not format_template:
+        return None
+    
+    result = pd.Series('', index=df.index, dtype=object)
+    for is_column, value in compile_location_template(format_template, df.columns.tolist()):
+        if not is_column:
+            result = result + value
+            continue
+        
+        # Handle NaN values and convert to string
+        column = df.iloc[:, value]
+        result = result + column.astype(str).str.strip().where(column.notna(), '')
+    
+    # Clean up any potential double periods from empty values
+    result = result.str.replace(r'\.\s*\.', '.', regex=True)
+    return result.str.replace(r'^\.|\.$', '', regex=True)
+
+def perform_dns_lookup(hostname):
+    """
+    Perform DNS lookup for a hostname using the system resolver
+    
+    The lookup itself has no timeout; DNSResolver abandons lookups that take longer than DNS_TIMEOUT.
+    
+    Args:
+        hostname (str): Hostname to lookup
+        
+    Returns:
+        tuple: (IP address, status message, IPv6 addresses); the IP address is the first IPv4 address,
+               or the first IPv6 address of hosts without one, and the IPv6 addresses are comma-separated
+    """
+    try:
+        address_info = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        if e.errno in (socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', socket.EAI_NONAME)):
+            return None, "Not found in DNS", None
+        if e.errno == socket.EAI_AGAIN:
+            return None, "DNS lookup timeout", None
+        logger.warning(f"      DNS lookup error: {str(e)}")
+        return None, "DNS lookup error", None
+    except Exception as e:
+        logger.warning(f"      DNS lookup error: {str(e)}")
+        return None, "DNS lookup error", None
+    
+    ipv4 = []
+    ipv6 = []
+    for family, _, _, _, sockaddr in address_info:
+        addresses = ipv4 if family == socket.AF_INET else ipv6
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    
+    if not ipv4 and not ipv6:
+        return None, "Not found in DNS", None
+    return (ipv4 or ipv6)[0], "Found in DNS", ', '.join(ipv6) or None
+
+class DNSResolver:
+    """Resolves hostnames in parallel and remembers the results for the rest of the run"""
+    
+    def __init__(self, workers=10, timings=None, timeout=DNS_TIMEOUT):
+        """
+        Initialize the resolver
+        
+        Args:
+            workers (int): Number of concurrent DNS lookups
+            timings (RunTimings): Collector for DNS lookup latencies (default: not recorded)
+            timeout (float): Number of seconds to wait for a lookup before reporting a timeout
+        """
+        self.workers = workers
+        self.timings = timings
+        self.timeout = timeout
+        self.results = {}
+        self.lock = threading.Lock()
+    
+    def lookup(self, hostname):
+        """
+        Look up a hostname without the cache, giving up after the timeout
+        
+        getaddrinfo cannot be interrupted, so each lookup runs in its own daemon thread. A lookup that
+        hangs past the timeout keeps its thread until the system resolver gives up, but it never delays
+        later lookups and does not hold up the exit of the script.
+        
+        Args:
+            hostname (str): Hostname to lookup
+            
+        Returns:
+            tuple: (IP address, status message, IPv6 addresses)
+        """
+        result = [(None, "DNS lookup timeout", None)]
+        
+        def run():
+            result[0] = perform_dns_lookup(hostname)
+        
+        thread = threading.Thread(target=run, name=f"dns-lookup-{hostname}", daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        return result[0]
+    
+    def resolve(self, hostname):
+        """
+        Resolve a single hostname, using the cached result if there is one
+        
+        Args:
+            hostname (str): Hostname to lookup
+            
+        Returns:
+            tuple: (IP address, status message, IPv6 addresses)
+        """
+        key = hostname.strip().lower()
+        with self.lock:
+            if key in self.results:
+                return self.results[key]
+        
+        start = time.perf_counter()
+        result = self.lookup(hostname)
+        if self.timings:
+            self.timings.add_latency('DNS lookup', time.perf_counter() - start)
+        # Only definitive answers are remembered; errors are retried on the next lookup
+        if result[1] in ("Found in DNS", "Not found in DNS"):
+            with self.lock:
+                self.results[key] = result
+        return result
+    
+    def resolve_many(self, hostnames):
+        """
+        Resolve a batch of hostnames in parallel
+        
+        Args:
+            hostnames (list): Hostnames to lookup
+            
+        Returns:
+            dict: (IP address, status message, IPv6 addresses) for each hostname
+        """
+        unique_hostnames = list(dict.fromkeys(hostnames))
+        if self.workers <= 1 or len(unique_hostnames) <= 1:
+            return {hostname: self.resolve(hostname) for hostname in unique_hostnames}
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(zip(unique_hostnames, executor.map(self.resolve, unique_hostnames)))
+    
+    def clear(self):
+        """Forget the remembered results, so the next lookups query DNS again"""
+        with self.lock:
+            self.results.clear()
+
+async def run_lookup_pipeline(client, resolver, hostnames, workers=1, on_result=None, queue_size=None):
+    """
+    Look up devices in a staged asyncio pipeline: API lookup, DNS fallback and result sink
+    
+    The stages are connected by bounded queues, so the DNS lookup of a device starts as soon as
+    its API lookup comes back empty, without holding up other API requests, and each result is
+    handed to the sink as soon as it is complete. The blocking API and DNS calls run in thread
+    pools driven by the event loop.
+    
+    Args:
+        client (LibreNMSClient): Client used to query the API
+        resolver (DNSResolver): Resolver for devices not found in LibreNMS
+        hostnames (list): Hostnames of the devices to query
+        workers (int): Number of concurrent API requests
+        on_result (callable): Called with (hostname, device information, DNS result) as each device completes
+        queue_size (int): Maximum number of items waiting between two stages (default: twice the workers)
+        
+    Returns:
+        tuple: (device information or None for each hostname, (IP address, status message, IPv6 addresses)
+                for each hostname not found in LibreNMS)
+    """
+    loop = asyncio.get_running_loop()
+    workers = max(1, workers)
+    dns_workers = max(1, resolver.workers)
+    queue_size = queue_size or workers * 2
+    lookup_queue = asyncio.Queue(queue_size)
+    dns_queue = asyncio.Queue(queue_size)
+    sink_queue = asyncio.Queue(queue_size)
+    devices = {}
+    dns_results = {}
+    total = len(hostnames)
+    done = 0
+    
+    async def feed():
+        for hostname in hostnames:
+            await lookup_queue.put(hostname)
+        for _ in range(workers):
+            await lookup_queue.put(None)
+    
+    async def lookup(executor):
+        nonlocal done
+        while (hostname := await lookup_queue.get()) is not None:
+            device_info = await loop.run_in_executor(executor, client.get_device_info, hostname)
+            done += 1
+            if done % 5 == 0 or done == total:
+                logger.info(f"  Progress: {done}/{total} ({(done / total) * 100:.1f}%)")
+            if device_info:
+                await sink_queue.put((hostname, device_info, None))
+            else:
+                await dns_queue.put(hostname)
+    
+    async def fallback(executor):
+        while (hostname := await dns_queue.get()) is not None:
+            dns_result = await loop.run_in_executor(executor, resolver.resolve, hostname)
+            await sink_queue.put((hostname, None, dns_result))
+    
+    async def sink():
+        while (item := await sink_queue.get()) is not None:
+            hostname, device_info, dns_result = item
+            devices[hostname] = device_info
+            if dns_result is not None:
+                dns_results[hostname] = dns_result
+            if on_result:
+                on_result(hostname, device_info, dns_result)
+    
+    async def lookup_stage(executor):
+        await asyncio.gather(*(lookup(executor) for _ in range(workers)))
+        for _ in range(dns_workers):
+            await dns_queue.put(None)
+    
+    async def fallback_stage(executor):
+        await asyncio.gather(*(fallback(executor) for _ in range(dns_workers)))
+        await sink_queue.put(None)
+    
+    with ThreadPoolExecutor(max_workers=workers) as api_executor, \
+            ThreadPoolExecutor(max_workers=dns_workers) as dns_executor:
+        tasks = [asyncio.ensure_future(stage) for stage in
+                 (feed(), lookup_stage(api_executor), fallback_stage(dns_executor), sink())]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+    
+    return {hostname: devices.get(hostname) for hostname in hostnames}, dns_results
+
+def lookup_pipeline(client, resolver, hostnames, workers=1, on_result=None):
+    """
+    Run run_lookup_pipeline to completion from synchronous code
+    
+    Args:
+        client (LibreNMSClient): Client used to query the API
+        resolver (DNSResolver): Resolver for devices not found in LibreNMS
+        hostnames (list): Hostnames of the devices to query
+        workers (int): Number of concurrent API requests
+        on_result (callable): Called with (hostname, device information, DNS result) as each device completes
+        
+    Returns:
+        tuple: (device information or None for each hostname, (IP address, status message, IPv6 addresses)
+                for each hostname not found in LibreNMS)
+    """
+    if not hostnames:
+        return {}, {}
+    return asyncio.run(run_lookup_pipeline(client, resolver, hostnames, workers, on_result))
+
+def is_location_compliant(location, expected_location):
+    """
+    Check if the location string matches the expected location
+    
+    Args:
+        location (str): Location string from API
+        expected_location (str): Expected location string built from column references
+        
+    Returns:
+        bool: True if compliant, False otherwise
+    """
+    if not location or not expected_location:
+        return False
+    
+    # Remove any extra whitespace and convert to lowercase for comparison
+    location = location.strip().lower()
+    expected_location = expected_location.strip().lower()
+    
+    return location == expected_location
+
+def locations_compliant(locations, expected_locations):
+    """
+    Check a whole column of location strings against the expected locations
+    
+    Args:
+        locations (pandas.Series): Location strings from the API
+        expected_locations (pandas.Series): Expected location strings, aligned with locations
+        
+    Returns:
+        pandas.Series: True where the location is compliant, False otherwise
+    """
+    location = locations.fillna('').astype(str).str.strip().str.lower()
+    expected = expected_locations.fillna('').astype(str).str.strip().str.lower()
+    return (location != '') & (expected != '') & (location == expected)
+
+class LocationMatcher:
+    """Classifies how close each API location is to its expected location, with a diff of what to fix"""
+    
+    def __init__(self, format_template=None, abbreviations=None, fuzzy_threshold=0.8):
+        """
+        Compile the separators and abbreviations used to normalize locations
+        
+        Args:
+            format_template (str): Format template with column references; its literal characters are
+                                   treated as separators in addition to whitespace and . - _ / ,
+            abbreviations (dict): Abbreviation for each word (e.g., {'RM': 'ROOM'}); both forms compare equal
+            fuzzy_threshold (float): Minimum similarity (0-1) for a location to count as a fuzzy match
+        """
+        literals = ''.join(re.split(r'\$[A-Z]+', format_template or ''))
+        separators = {char for char in literals + '.-_/,' if not char.isalnum()}
+        self.separator_pattern = re.compile(f"[{re.escape(''.join(sorted(separators)))}\\s]+")
+        self.abbreviations = {short.lower(): long.lower() for short, long in (abbreviations or {}).items()}
+        self.abbreviation_pattern = None
+        if self.abbreviations:
+            words = '|'.join(re.escape(word) for word in sorted(self.abbreviations, key=len, reverse=True))
+            self.abbreviation_pattern = re.compile(f"(?<![^.])(?:{words})(?![^.])")
+        self.fuzzy_threshold = fuzzy_threshold
+    
+    def normalize(self, locations):
+        """
+        Normalize a column of locations: lowercase, a single '.' between tokens and abbreviations expanded
+        
+        Args:
+            locations (pandas.Series): Location strings
+            
+        Returns:
+            pandas.Series: Normalized location strings
+        """
+        normalized = locations.fillna('').astype(str).str.lower()
+        normalized = normalized.str.replace(self.separator_pattern, '.', regex=True).str.strip('.')
+        if self.abbreviation_pattern is not None:
+            normalized = normalized.str.replace(self.abbreviation_pattern,
+                                                lambda match: self.abbreviations[match.group(0)], regex=True)
+        return normalized
+    
+    def normalize_one(self, location):
+        """
+        Normalize a single location the same way as normalize
+        
+        Args:
+            location (str): Location string
+            
+        Returns:
+            str: Normalized location string
+        """
+        normalized = self.separator_pattern.sub('.', str(location).lower()).strip('.')
+        if self.abbreviation_pattern is not None:
+            normalized = self.abbreviation_pattern.sub(lambda match: self.abbreviations[match.group(0)], normalized)
+        return normalized
+    
+    def tokens(self, location):
+        """
+        Split a location into its tokens
+        
+        Args:
+            location (str): Location string
+            
+        Returns:
+            list: Tokens of the location, in their original case
+        """
+        return [token for token in self.separator_pattern.split(str(location or '').strip()) if token]
+    
+    def diff(self, location, expected_location):
+        """
+        Describe the changes that turn a location into the expected location
+        
+        Args:
+            location (str): Location string from the API
+            expected_location (str): Expected location string built from column references
+            
+        Returns:
+            str: Token-level description of the changes, separated by semicolons
+        """
+        if not location:
+            return f"set to '{expected_location}'"
+        found, wanted = self.tokens(location), self.tokens(expected_location)
+        found_keys = [self.abbreviations.get(token.lower(), token.lower()) for token in found]
+        wanted_keys = [self.abbreviations.get(token.lower(), token.lower()) for token in wanted]
+        if found_keys == wanted_keys:
+            return f"formatting: '{location}' -> '{expected_location}'"
+        if sorted(found_keys) == sorted(wanted_keys):
+            return f"order: '{location}' -> '{expected_location}'"
+        
+        changes = []
+        opcodes = difflib.SequenceMatcher(None, found_keys, wanted_keys, autojunk=False).get_opcodes()
+        for operation, found_start, found_end, wanted_start, wanted_end in opcodes:
+            removed = ' '.join(found[found_start:found_end])
+            added = ' '.join(wanted[wanted_start:wanted_end])
+            if operation == 'replace':
+                changes.append(f"'{removed}' -> '{added}'")
+            elif operation == 'delete':
+                changes.append(f"remove '{removed}'")
+            elif operation == 'insert':
+                changes.append(f"add '{added}'")
+        return '; '.join(changes)
+    
+    def match(self, locations, expected_locations):
+        """
+        Classify a whole column of locations against the expected locations
+        
+        Exact, normalized and reordered matches are found with vectorized string operations; the
+        similarity score and diff are only computed for the remaining rows, once per distinct pair.
+        
+        Args:
+            locations (pandas.Series): Location strings from the API
+            expected_locations (pandas.Series): Expected location strings, aligned with locations
+            
+        Returns:
+            pandas.DataFrame: Match class (exact, normalized, reordered, fuzzy or mismatch), Match_Score
+                              (0-100) and Location_Diff for each row
+        """
+        result = pd.DataFrame({'Match': 'exact', 'Match_Score': 100, 'Location_Diff': ''}, index=locations.index)
+        rest = locations.index[~locations_compliant(locations, expected_locations)]
+        found = self.normalize(locations.loc[rest])
+        wanted = self.normalize(expected_locations.loc[rest])
+        
+        # Score and diff each distinct (location, expected) pair once
+        pairs = pd.DataFrame({'found': found, 'wanted': wanted,
+                              'location': locations.loc[rest].fillna('').astype(str),
+                              'expected': expected_locations.loc[rest].fillna('').astype(str)})
+        scores = {}
+        diffs = {}
+        for found_value, wanted_value, location, expected in pairs.drop_duplicates().itertuples(index=False, name=None):
+            key = (location, expected)
+            scores[key] = difflib.SequenceMatcher(None, found_value, wanted_value, autojunk=False).ratio() \
+                if found_value else 0.0
+            diffs[key] = self.diff(location, expected)
+        keys = list(zip(pairs['location'], pairs['expected']))
+        score = pd.Series([scores[key] for key in keys], index=rest, dtype=float)
+        
+        normalized = (found != '') & (found == wanted)
+        reordered = ~normalized & (found != '') & (
+            found.str.split('.').map(sorted) == wanted.str.split('.').map(sorted))
+        fuzzy = ~normalized & ~reordered & (score >= self.fuzzy_threshold)
+        match = pd.Series('mismatch', index=rest, dtype=object)
+        match[fuzzy] = 'fuzzy'
+        match[reordered] = 'reordered'
+        match[normalized] = 'normalized'
+        score[normalized] = 1.0
+        
+        result.loc[rest, 'Match'] = match
+        result.loc[rest, 'Match_Score'] = (score * 100).round().astype(int)
+        result.loc[rest, 'Location_Diff'] = [diffs[key] for key in keys]
+        return result
+    
+    def match_one(self, location, expected_location):
+        """
+        Classify a single location against its expected location
+        
+        Gives the same result as match without building a DataFrame, for per-device checks.
+        
+        Args:
+            location (str): Location string from the API
+            expected_location (str): Expected location string built from column references
+            
+        Returns:
+            tuple: (match class, score from 0 to 100, diff)
+        """
+        location = '' if location is None or pd.isna(location) else str(location)
+        expected_location = '' if expected_location is None or pd.isna(expected_location) else str(expected_location)
+        if is_location_compliant(location, expected_location):
+            return 'exact', 100, ''
+        
+        found, wanted = self.normalize_one(location), self.normalize_one(expected_location)
+        score = difflib.SequenceMatcher(None, found, wanted, autojunk=False).ratio() if found else 0.0
+        if found and found == wanted:
+            match, score = 'normalized', 1.0
+        elif found and sorted(found.split('.')) == sorted(wanted.split('.')):
+            match = 'reordered'
+        elif score >= self.fuzzy_threshold:
+            match = 'fuzzy'
+        else:
+            match = 'mismatch'
+        return match, int(round(score * 100)), self.diff(location, expected_location)
+
+def compact_column(values, length, row_positions, categories=None):
+    """
+    Build a sheet column that stores each distinct value only once
+    
+    Args:
+        values (array-like): Value for each row in row_positions
+        length (int): Number of rows in the sheet
+        row_positions (numpy.ndarray): Positions of the rows that have a value; other rows are left empty
+        categories (list): Allowed values of an enum column (default: the distinct values)
+        
+    Returns:
+        pandas.Categorical: Column for the whole sheet
+    """
+    values = pd.Categorical(values, categories=categories)
+    codes = np.full(length, -1, dtype=values.codes.dtype)
+    codes[row_positions] = values.codes
+    return pd.Categorical.from_codes(codes, dtype=values.dtype)
+
+def merge_results(df, row_hostnames, devices, dns_results, expected_locations=None, matcher=None, keep_columns=()):
+    """
+    Join the lookup results onto the sheet by hostname and check location compliance
+    
+    The result columns are stored as categoricals, so repeated values such as sysDescr or
+    Status are kept once per sheet instead of once per row.
+    
+    Args:
+        df (pandas.DataFrame): Sheet data, updated in place
+        row_hostnames (pandas.Series): Full hostname for each row that was looked up, indexed like df
+        devices (dict): Device information (or None if not found) for each hostname
+        dns_results (dict): (IP address, status message, IPv6 addresses) for each hostname not found in LibreNMS
+        expected_locations (pandas.Series): Expected location for each row, or None if there is no template
+        matcher (LocationMatcher): Matcher used to classify non-compliant locations (default: a new matcher)
+        keep_columns (set): Result columns that are also input columns of the sheet and are left unchanged
+        
+    Returns:
+        dict: Number of devices found, not found, compliant and non-compliant, and of the
+              normalized, reordered and fuzzy near misses
+    """
+    length = len(df)
+    rows = df.index.get_indexer(row_hostnames.index)
+    columns = {}
+    
+    # Position of each row's device among the devices that were found, or -1
+    found_hostnames = [hostname for hostname, device_info in devices.items() if device_info]
+    device_positions = pd.Index(found_hostnames, dtype=object).get_indexer(row_hostnames)
+    found = device_positions >= 0
+    found_rows, found_positions = rows[found], device_positions[found]
+    for field in DEVICE_FIELDS:
+        field_values = np.array([devices[hostname].get(field) for hostname in found_hostnames] + [None],
+                                dtype=object)[:-1]
+        field_values[pd.isna(field_values)] = ''
+        columns[field] = compact_column(field_values[found_positions], length, found_rows)
+    
+    dns_hostnames = list(dns_results)
+    dns_positions = pd.Index(dns_hostnames, dtype=object).get_indexer(row_hostnames)
+    has_dns = ~found & (dns_positions >= 0)
+    for column, part in (('DNS_IP', 0), ('DNS_Status', 1), ('DNS_IPv6', 2)):
+        column_values = np.array([dns_results[hostname][part] for hostname in dns_hostnames] + [None],
+                                 dtype=object)[:-1]
+        columns[column] = compact_column(column_values[dns_positions[has_dns]], length, rows[has_dns])
+    columns['Status'] = compact_column(np.where(found, STATUS_VALUES[0], STATUS_VALUES[1]), length, rows, STATUS_VALUES)
+    
+    # Only devices with an expected location count towards compliance
+    compliant = np.zeros(len(rows), dtype=bool)
+    has_expected = np.zeros(len(rows), dtype=bool)
+    match_counts = {}
+    columns['Match'] = columns['Match_Score'] = columns['Location_Diff'] = None
+    if expected_locations is not None:
+        expected = expected_locations.loc[row_hostnames.index]
+        has_expected = found & (expected.fillna('') != '').to_numpy()
+        locations = pd.Series(np.asarray(columns['location'][rows[has_expected]], dtype=object),
+                              index=row_hostnames.index[has_expected])
+        matches = (matcher or LocationMatcher()).match(locations, expected[has_expected])
+        compliant[has_expected] = (matches['Match'] == 'exact').to_numpy()
+        match_rows = rows[has_expected]
+        columns['Match'] = compact_column(matches['Match'], length, match_rows, MATCH_CLASSES)
+        match_scores = np.zeros(length, dtype='uint8')
+        match_scores[match_rows] = matches['Match_Score'].to_numpy()
+        match_mask = np.ones(length, dtype=bool)
+        match_mask[match_rows] = False
+        columns['Match_Score'] = pd.arrays.IntegerArray(match_scores, match_mask)
+        columns['Location_Diff'] = compact_column(matches['Location_Diff'], length, match_rows)
+        if 'Expected_Location' not in keep_columns:
+            columns['Expected_Location'] = df['Expected_Location'].astype('category')
+        match_counts = matches['Match'].value_counts().to_dict()
+    columns['Compliant'] = compact_column(np.where(compliant[found], COMPLIANT_VALUES[0], COMPLIANT_VALUES[1]),
+                                          length, found_rows, COMPLIANT_VALUES)
+    for column, values in columns.items():
+        if column not in keep_columns:
+            df[column] = values
+    
+    return {
+        'found': int(found.sum()),
+        'not_found': int((~found).sum()),
+        'compliant': int((has_expected & compliant).sum()),
+        'non_compliant': int((has_expected & ~compliant).sum()),
+        'normalized': int(match_counts.get('normalized', 0)),
+        'reordered': int(match_counts.get('reordered', 0)),
+        'fuzzy': int(match_counts.get('fuzzy', 0)),
+    }
+
+class AuditResult:
+    """Compliance audit result for a single device record"""
+    
+    __slots__ = ('index', 'device_name', 'hostname', 'expected_location', 'device', 'compliant',
+                 'match', 'match_score', 'location_diff', 'dns_ip', 'dns_status', 'dns_ipv6')
+    
+    def __init__(self, index, device_name, hostname, expected_location, device, compliant=None,
+                 dns_ip=None, dns_status=None, match=None, match_score=None, location_diff=None, dns_ipv6=None):
+        """
+        Initialize the audit result
+        
+        Args:
+            index (int): Position of the record in the input
+            device_name (str): Device name from the input record
+            hostname (str): Full hostname that was looked up
+            expected_location (str): Expected location built from the template, or None without a template
+            device (dict): Device information from the API, or None if not found
+            compliant (bool): Whether the location is compliant, or None if the device was not found
+            dns_ip (str): IP address from DNS lookup for devices not found in LibreNMS
+            dns_status (str): Status of the DNS lookup for devices not found in LibreNMS
+            match (str): Match class from LocationMatcher, or None without an expected location
+            match_score (int): Similarity of the location to the expected location (0-100)
+            location_diff (str): Changes that turn the location into the expected location
+            dns_ipv6 (str): Comma-separated IPv6 addresses from DNS lookup for devices not found in LibreNMS
+        """
+        self.index = index
+        self.device_name = device_name
+        self.hostname = hostname
+        self.expected_location = expected_location
+        self.device = device
+        self.compliant = compliant
+        self.match = match
+        self.match_score = match_score
+        self.location_diff = location_diff
+        self.dns_ip = dns_ip
+        self.dns_status = dns_status
+        self.dns_ipv6 = dns_ipv6
+    
+    @property
+    def found(self):
+        """bool: Whether the device was found in LibreNMS"""
+        return self.device is not None
+    
+    @property
+    def status(self):
+        """str: Status as written to the Status column"""
+        return 'Found' if self.found else 'Not found in LibreNMS'
+    
+    def to_dict(self):
+        """
+        Convert the result to the columns added to the Excel sheet
+        
+        Returns:
+            dict: Value for each of RESULT_COLUMNS
+        """
+        row = {field: self.device.get(field, '') if self.found else None for field in DEVICE_FIELDS}
+        row['Expected_Location'] = self.expected_location
+        row['Compliant'] = ('Yes' if self.compliant else 'No') if self.found else None
+        row['Match'] = self.match
+        row['Match_Score'] = self.match_score
+        row['Location_Diff'] = self.location_diff
+        row['Status'] = self.status
+        row['DNS_IP'] = self.dns_ip
+        row['DNS_IPv6'] = self.dns_ipv6
+        row['DNS_Status'] = self.dns_status
+        return row
+    
+    def __repr__(self):
+        return f"AuditResult(index={self.index}, hostname={self.hostname!r}, status={self.status!r}, compliant={self.compliant!r})"
+
+def audit_record(index, device_name, expected_location, client, resolver, matcher,
+                 domain_suffix=".sac.ragingwire.net"):
+    """
+    Look up a single device and check its location against the expected location
+    
+    Args:
+        index (int): Position of the record in the input, or None
+        device_name (str): Device name from the input record
+        expected_location (str): Expected location built from the template, or None without a template
+        client (LibreNMSClient): Client used to query the API
+        resolver (DNSResolver): Resolver for devices not found in LibreNMS
+        matcher (LocationMatcher): Matcher used to classify locations
+        domain_suffix (str): Domain suffix to append to hostnames
+        
+    Returns:
+        AuditResult: Result for the device
+    """
+    hostname = normalize_hostname(device_name, domain_suffix)
+    device = client.get_device_info(hostname)
+    if device is None:
+        dns_ip, dns_status, dns_ipv6 = resolver.resolve(hostname)
+        return AuditResult(index, device_name, hostname, expected_location, None,
+                           dns_ip=dns_ip, dns_status=dns_status, dns_ipv6=dns_ipv6)
+    
+    if not expected_location:
+        return AuditResult(index, device_name, hostname, expected_location, device, False)
+    match, match_score, location_diff = matcher.match_one(device.get('location', ''), expected_location)
+    return AuditResult(index, device_name, hostname, expected_location, device, match == 'exact',
+                       match=match, match_score=match_score, location_diff=location_diff)
+
+def audit_devices(records, client, location_format=None, domain_suffix=".sac.ragingwire.net", device_column=0,
+                  columns=None, resolver=None, workers=1, matcher=None):
+    """
+    Audit an iterable of device records, yielding results lazily as lookups complete
+    
+    Records are consumed as they are needed and at most a few lookups per worker are in
+    flight at any time, so memory use does not grow with the size of the input.
+    
+    Args:
+        records (iterable): Device records, either mappings (e.g. dicts or CSV rows) or sequences of values
+        client (LibreNMSClient): Client used to query the API
+        location_format (str): Format template with column references (e.g., $B.$C$E.$F)
+        domain_suffix (str): Domain suffix to append to hostnames
+        device_column (int): Zero-based index of the field containing device names
+        columns (list): Field names in column order (default: the fields of the first record)
+        resolver (DNSResolver): Resolver for devices not found in LibreNMS (default: a new resolver)
+        workers (int): Number of concurrent lookups
+        matcher (LocationMatcher): Matcher used to classify locations (default: compiled from location_format)
+        
+    Yields:
+        AuditResult: Result for each record with a device name, in completion order
+    """
+    resolver = resolver or DNSResolver(1)
+    matcher = matcher or LocationMatcher(location_format)
+    plan = None
+    
+    def audit(index, values):
+        expected_location = render_location(plan, values) if plan is not None else None
+        return audit_record(index, str(values[device_column]).strip(), expected_location, client, resolver,
+                            matcher, domain_suffix)
+    
+    def pending_records():
+        nonlocal plan
+        for index, record in enumerate(records):
+            values = list(record.values()) if isinstance(record, Mapping) else list(record)
+            if plan is None and location_format:
+                plan = compile_location_template(location_format, columns or (
+                    list(record.keys()) if isinstance(record, Mapping) else values))
+            
+            device_name = values[device_column] if device_column < len(values) else None
+            if device_name is None or pd.isna(device_name) or not str(device_name).strip():
+                continue
+            yield index, values
+    
+    if workers <= 1:
+        for index, values in pending_records():
+            yield audit(index, values)
+        return
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for index, values in pending_records():
+            in_flight.add(executor.submit(audit, index, values))
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(in_flight):
+            yield future.result()
+
+def column_widths(df):
+    """
+    Compute Excel column widths from the longest value in each column
+    
+    Args:
+        df (pandas.DataFrame): Sheet data
+        
+    Returns:
+        list: Column width for each column of df
+    """
+    widths = []
+    for col_idx, column in enumerate(df.columns):
+        values = df.iloc[:, col_idx]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Measure each distinct value once instead of every row
+            values = pd.Series(values.cat.remove_unused_categories().cat.categories)
+        max_length = values.astype(str).where(values.notna(), '').str.len().max() if len(values) else 0
+        widths.append(max(len(str(column)), int(max_length) if pd.notna(max_length) else 0) + 2)
+    return widths
+
+class ExcelOutput:
+    """Writes processed sheets and the summary sheet back to the Excel file"""
+    
+    def __init__(self, excel_path, write_only=False):
+        """
+        Initialize the Excel output
+        
+        Args:
+            excel_path (str): Path to the Excel file
+            write_only (bool): Stream every sheet into a new workbook using openpyxl write-only mode
+                               instead of replacing sheets in the existing workbook
+        """
+        self.excel_path = excel_path
+        self.write_only = write_only
+        self.writer = None
+        self.workbook = None
+    
+    def __enter__(self):
+        if self.write_only:
+            self.workbook = Workbook(write_only=True)
+        else:
+            self.writer = pd.ExcelWriter(self.excel_path, engine='openpyxl', mode='a', if_sheet_exists='replace')
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.write_only:
+            # Only replace the workbook once every sheet has been written
+            if exc_type is None:
+                self.workbook.save(self.excel_path)
+        else:
+            self.writer.close()
+        return False
+    
+    def keep_sheet(self, sheet_name, df):
+        """
+        Keep a sheet that was not processed
+        
+        Args:
+            sheet_name (str): Name of the sheet
+            df (pandas.DataFrame): Sheet data as read from the Excel file
+        """
+        # Sheets are only lost when the workbook is rewritten from scratch
+        if self.write_only:
+            self._stream_sheet(sheet_name, df, [])
+    
+    def write_sheet(self, sheet_name, df, widths=None):
+        """
+        Write a processed sheet with highlighting for compliance and devices not found
+        
+        Args:
+            sheet_name (str): Name of the sheet
+            df (pandas.DataFrame): Processed sheet data
+            widths (list): Precomputed column widths (default: computed from df)
+        """
+        columns = df.columns.tolist()
+        first_row, last_row = 2, len(df) + 1
+        last_column = get_column_letter(max(len(columns), 1))
+        
+        if self.write_only:
+            # Colors come from conditional formatting rules so rows can be streamed as plain values
+            rules = []
+            if 'Status' in columns:
+                status_column = get_column_letter(columns.index('Status') + 1)
+                rules.append((f"A{first_row}:{last_column}{last_row}",
+                              FormulaRule(formula=[f'${status_column}{first_row}="Not found in LibreNMS"'],
+                                          fill=NOT_FOUND_FILL)))
+            if 'Compliant' in columns:
+                compliant_column = get_column_letter(columns.index('Compliant') + 1)
+                compliant_range = f"{compliant_column}{first_row}:{compliant_column}{last_row}"
+                rules.append((compliant_range, CellIsRule(operator='equal', formula=['"Yes"'], fill=COMPLIANT_FILL)))
+                rules.append((compliant_range, CellIsRule(operator='equal', formula=['"No"'], fill=NON_COMPLIANT_FILL)))
+            self._stream_sheet(sheet_name, df, rules, widths=widths)
+            return
+        
+        df.to_excel(self.writer, sheet_name=sheet_name, index=False)
+        worksheet = self.writer.sheets[sheet_name]
+        self._format_header(worksheet, df)
+        
+        # Fill only the rows that need highlighting, in a single pass per rule
+        if 'Status' in columns:
+            not_found_rows = (df['Status'] == 'Not found in LibreNMS').to_numpy().nonzero()[0]
+            for position in not_found_rows:
+                for col_idx in range(1, len(columns) + 1):
+                    worksheet.cell(row=position + first_row, column=col_idx).fill = NOT_FOUND_FILL
+        if 'Compliant' in columns:
+            compliant_idx = columns.index('Compliant') + 1
+            for value, fill in (('Yes', COMPLIANT_FILL), ('No', NON_COMPLIANT_FILL)):
+                for position in (df['Compliant'] == value).to_numpy().nonzero()[0]:
+                    worksheet.cell(row=position + first_row, column=compliant_idx).fill = fill
+        
+        self._set_column_widths(worksheet, df, widths)
+    
+    def write_summary(self, summary_df):
+        """
+        Write the Summary sheet with a highlighted totals row
+        
+        Args:
+            summary_df (pandas.DataFrame): Summary data, with the totals in the last row
+        """
+        if self.write_only:
+            self._stream_sheet('Summary', summary_df, [], total_row=True)
+            return
+        
+        summary_df.to_excel(self.writer, sheet_name='Summary', index=False)
+        worksheet = self.writer.sheets['Summary']
+        self._format_header(worksheet, summary_df)
+        
+        # Format totals row
+        for col_idx in range(1, len(summary_df.columns) + 1):
+            cell = worksheet.cell(row=len(summary_df) + 1, column=col_idx)
+            cell.fill = TOTAL_FILL
+            cell.font = TOTAL_FONT
+        
+        self._set_column_widths(worksheet, summary_df)
+    
+    def _format_header(self, worksheet, df):
+        for col_idx in range(1, len(df.columns) + 1):
+            cell = worksheet.cell(row=1, column=col_idx)
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+    
+    def _set_column_widths(self, worksheet, df, widths=None):
+        for col_idx, width in enumerate(widths or column_widths(df), 1):
+            worksheet.column_dimensions[get_column_letter(col_idx)].width = width
+    
+    def _stream_sheet(self, sheet_name, df, rules, total_row=False, widths=None):
+        worksheet = self.workbook.create_sheet(sheet_name)
+        
+        # Column widths must be set before the first row is written
+        self._set_column_widths(worksheet, df, widths)
+        for cell_range, rule in rules:
+            worksheet.conditional_formatting.add(cell_range, rule)
+        
+        if len(df.columns) == 0:
+            return worksheet
+        
+        header = []
+        for column in df.columns:
+            cell = WriteOnlyCell(worksheet, value=str(column))
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            header.append(cell)
+        worksheet.append(header)
+        
+        values = df.astype(object).where(df.notna(), None)
+        rows = values.itertuples(index=False, name=None)
+        for row_number, row in enumerate(rows, 1):
+            if total_row and row_number == len(df):
+                row = [self._total_cell(worksheet, value) for value in row]
+            worksheet.append(row)
+        return worksheet
+    
+    def _total_cell(self, worksheet, value):
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell.fill = TOTAL_FILL
+        cell.font = TOTAL_FONT
+        return cell
+
+def collect_location_fixes(df, row_hostnames, targets):
+    """
+    Collect the expected location of every non-compliant device in a processed sheet
+    
+    Args:
+        df (pandas.DataFrame): Processed sheet data
+        row_hostnames (pandas.Series): Full hostname for each row that was looked up, indexed like df
+        targets (dict): Match class of each expected location of each lowercased hostname, updated in place
+    """
+    rows = df.loc[row_hostnames.index]
+    expected = rows['Expected_Location'].astype(object).fillna('').astype(str)
+    fix = (rows['Compliant'] == 'No') & (expected != '')
+    for hostname, expected_location, match in zip(row_hostnames[fix], expected[fix], rows['Match'][fix]):
+        targets.setdefault(hostname.lower(), {})[expected_location] = match
+
+def apply_location_fixes(client, targets, devices, journal, workers=1, dry_run=False, batch_size=100,
+                         near_misses=False):
+    """
+    Push the expected locations of non-compliant devices to LibreNMS in concurrent batches
+    
+    Args:
+        client (LibreNMSClient): Client used to update the devices
+        targets (dict): Match class of each expected location of each lowercased hostname, from
+                        collect_location_fixes
+        devices (dict): Device information for each lowercased hostname
+        journal (ApplyJournal): Journal receiving the outcome of every update
+        workers (int): Number of concurrent API requests
+        dry_run (bool): Only log and journal the changes that would be made
+        batch_size (int): Number of updates sent before progress is reported
+        near_misses (bool): Also update devices whose location is a normalized or fuzzy match of the
+                            expected location
+        
+    Returns:
+        dict: Number of devices updated, failed, skipped and dry-run
+    """
+    counts = {'updated': 0, 'failed': 0, 'skipped': 0, 'dry-run': 0}
+    fixes = []
+    for hostname, expected_locations in sorted(targets.items()):
+        current_location = devices[hostname].get('location', '')
+        if len(expected_locations) > 1:
+            # Rows referencing the same device disagree; leave it for a person to decide
+            reason = f"rows expect different locations: {', '.join(sorted(expected_locations))}"
+            logger.warning(f"  Skipping {hostname}: {reason}")
+            journal.record(hostname, current_location, None, 'skipped', reason)
+            counts['skipped'] += 1
+            continue
+        expected_location, match = next(iter(expected_locations.items()))
+        if match in ('normalized', 'fuzzy') and not near_misses:
+            # A near miss is as likely to be a typo in the sheet as in LibreNMS
+            reason = f"{match} match, only updated with --apply-near-misses"
+            logger.info(f"  Skipping {hostname}: {reason}")
+            journal.record(hostname, current_location, expected_location, 'skipped', reason)
+            counts['skipped'] += 1
+            continue
+        fixes.append((hostname, current_location, expected_location))
+    
+    total = len(fixes)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for start in range(0, total, batch_size):
+            batch = fixes[start:start + batch_size]
+            if dry_run:
+                results = [(None, 'dry run')] * len(batch)
+            else:
+                results = executor.map(lambda fix: client.update_device_location(fix[0], fix[2], devices[fix[0]]),
+                                       batch)
+            for (hostname, current_location, expected_location), (updated, message) in zip(batch, results):
+                status = 'dry-run' if dry_run else 'updated' if updated else 'failed'
+                counts[status] += 1
+                journal.record(hostname, current_location, expected_location, status, message)
+                if dry_run:
+                    logger.info(f"  Would set {hostname}: '{current_location}' -> '{expected_location}'")
+                elif not updated:
+                    logger.warning(f"  Failed to update {hostname}: {message}",
+                                   extra={'hostname': hostname, 'error': message})
+            logger.info(f"  Location updates: {min(start + batch_size, total)}/{total}")
+    return counts
+
+def report_location_fixes(counts, journal_path, dry_run):
+    """
+    Log the outcome of apply_location_fixes
+    
+    Args:
+        counts (dict): Counts returned by apply_location_fixes
+        journal_path (str): Path to the journal with the outcome of every update
+        dry_run (bool): Whether the updates were only simulated
+    """
+    if dry_run:
+        logger.info(f"\nDry run: {counts['dry-run']} locations would be updated, {counts['skipped']} skipped "
+                    f"(see {journal_path})", extra=counts)
+    else:
+        logger.info(f"\nUpdated {counts['updated']} locations in LibreNMS, {counts['failed']} failed, "
+                    f"{counts['skipped']} skipped (see {journal_path})", extra=counts)
+
+def create_client(api_url, api_token, bulk=False, workers=1, rate_limit=None, retries=3, connect_timeout=5,
+                  read_timeout=30, cache_file=None, cache_ttl=0, negative_cache_ttl=300, refresh=False, delta=False,
+                  snapshot_file=None, timings=None):
+    """
+    Create the LibreNMS client for a run, with its device cache and bulk inventory
+    
+    Args:
+        api_url (str): Base URL for the LibreNMS API
+        api_token (str): API token for authentication
+        bulk (bool): Fetch the whole device inventory once instead of querying each device
+        workers (int): Number of concurrent API requests
+        rate_limit (float): Maximum number of API requests per second (default: unlimited)
+        retries (int): Number of retries for connection errors and 429/5xx responses
+        connect_timeout (float): Timeout in seconds for establishing a connection to the API
+        read_timeout (float): Timeout in seconds for reading an API response
+        cache_file (str): Path to the persistent device cache (default: DEFAULT_CACHE_FILE)
+        cache_ttl (float): Number of seconds cached device records stay valid (0 disables the cache)
+        negative_cache_ttl (float): Number of seconds cached "not found" results stay valid
+        refresh (bool): Ignore cached device records and query the API again
+        delta (bool): Only query devices whose last_polled or location changed since the previous delta run
+        snapshot_file (str): Path to the snapshot of the previous delta run (default: DEFAULT_SNAPSHOT_FILE)
+        timings (RunTimings): Collector for API latencies and the inventory prefetch time
+        
+    Returns:
+        LibreNMSClient: Client ready to look up devices
+    """
+    cache = None
+    if cache_ttl > 0:
+        cache = DeviceCache(cache_file or DEFAULT_CACHE_FILE, cache_ttl, negative_cache_ttl, refresh=refresh)
+        logger.info(f"Using device cache at {cache.path}")
+    snapshot = None
+    if delta:
+        snapshot = DeviceSnapshot(snapshot_file or DEFAULT_SNAPSHOT_FILE)
+        logger.info(f"Using device snapshot at {snapshot.path}")
+    client = LibreNMSClient(api_url, api_token, rate_limit=rate_limit, pool_size=max(10, workers), retries=retries,
+                            connect_timeout=connect_timeout, read_timeout=read_timeout, cache=cache,
+                            snapshot=snapshot, timings=timings)
+    
+    if delta:
+        logger.info("Fetching device change markers from LibreNMS...")
+        with timings.phase('delta listing') if timings else nullcontext():
+            delta_counts = client.prepare_delta()
+        if delta_counts is None:
+            logger.warning("  Warning: Could not fetch device inventory, querying every device")
+        else:
+            logger.info(f"  {delta_counts[0]} devices unchanged since the last run, {delta_counts[1]} new or changed")
+    
+    if bulk:
+        logger.info("Fetching device inventory from LibreNMS...")
+        with timings.phase('inventory prefetch') if timings else nullcontext():
+            device_count = client.prefetch_devices(DEVICE_FIELDS)
+        if device_count is None:
+            logger.warning("  Warning: Could not fetch device inventory, falling back to per-device queries")
+        else:
+            logger.info(f"  Indexed {device_count} devices")
+    
+    return client
+
+def detect_file_format(path):
+    """
+    Detect the format of an input or output file from its extension
+    
+    Args:
+        path (str): Path to the file
+        
+    Returns:
+        str: 'excel', 'csv', 'parquet' or 'jsonl', or None if the extension is not supported
+    """
+    extension = os.path.splitext(path)[1].lower()
+    return FILE_FORMATS.get(extension)
+
+def read_table_chunks(path, file_format, chunk_size=10000):
+    """
+    Read a CSV, Parquet or JSONL file in chunks
+    
+    CSV cells and JSON strings are kept as text, so device names and location parts such as '01'
+    are not turned into numbers.
+    
+    Args:
+        path (str): Path to the file
+        file_format (str): 'csv', 'parquet' or 'jsonl'
+        chunk_size (int): Number of rows per chunk
+        
+    Yields:
+        pandas.DataFrame: Next chunk of rows, indexed by row number in the file
+    """
+    if file_format == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    elif file_format == 'jsonl':
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+    elif file_format == 'parquet':
+        import pyarrow.parquet as pq
+        start = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+    else:
+        raise ValueError(f"Unsupported input format: {path}")
+
+class TableOutput:
+    """Writes audited rows to a CSV, Parquet or JSONL file one chunk at a time"""
+    
+    def __init__(self, path, file_format, input_schema=None):
+        """
+        Initialize the table output
+        
+        Args:
+            path (str): Path to the output file
+            file_format (str): 'csv', 'parquet' or 'jsonl'
+            input_schema (pyarrow.Schema): Schema of a Parquet input, whose column types are kept in a
+                                           Parquet output (default: input columns are written as strings)
+        """
+        if file_format not in ('csv', 'parquet', 'jsonl'):
+            raise ValueError(f"Unsupported output format: {path}")
+        self.path = path
+        self.file_format = file_format
+        self.file = None
+        self.parquet_writer = None
+        self.input_schema = input_schema
+        self.schema = None
+    
+    def __enter__(self):
+        if self.file_format != 'parquet':
+            self.file = open(self.path, 'w', newline='', encoding='utf-8')
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.file is not None:
+            self.file.close()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        return False
+    
+    def write(self, df):
+        """
+        Append a chunk of audited rows
+        
+        Args:
+            df (pandas.DataFrame): Audited rows, including RESULT_COLUMNS
+        """
+        if self.file_format == 'csv':
+            df.to_csv(self.file, header=self.file.tell() == 0, index=False)
+        elif self.file_format == 'jsonl':
+            text = df.to_json(orient='records', lines=True, date_format='iso')
+            self.file.write(text if text.endswith('\n') else text + '\n')
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            
+            if self.parquet_writer is None:
+                # The types pandas infers can differ from chunk to chunk, so every chunk is written with
+                # one schema: input columns keep their Parquet type, everything else is a string
+                fields = []
+                for col in df.columns:
+                    if self.input_schema is not None and col not in RESULT_COLUMNS and col in self.input_schema.names:
+                        fields.append(self.input_schema.field(col))
+                    else:
+                        fields.append(pa.field(str(col), pa.string()))
+                self.schema = pa.schema(fields)
+                self.parquet_writer = pq.ParquetWriter(self.path, self.schema)
+            df = df.astype({field.name: 'string' for field in self.schema if field.type == pa.string()})
+            self.parquet_writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+def process_table_file(input_path, output_path, api_url, api_token, location_format,
+                       domain_suffix=".sac.ragingwire.net", device_column=0, chunk_size=10000, bulk=False, workers=1,
+                       rate_limit=None, retries=3, connect_timeout=5, read_timeout=30, cache_file=None, cache_ttl=0,
+                       negative_cache_ttl=300, refresh=False, dns_workers=10, abbreviations=None, fuzzy_threshold=0.8,
+                       delta=False, snapshot_file=None, apply=False, dry_run=False, apply_batch_size=100,
+                       apply_near_misses=False, timings=None):
+    """
+    Process a CSV, Parquet or JSONL inventory in chunks and write the audited rows to a new file
+    
+    Args:
+        input_path (str): Path to the input file (.csv, .parquet or .jsonl)
+        output_path (str): Path to the output file (.csv, .parquet or .jsonl)
+        api_url (str): Base URL for the LibreNMS API
+        api_token (str): API token for authentication
+        location_format (str): Format template with column references (e.g., $B.$C$E.$F)
+        domain_suffix (str): Domain suffix to append to hostnames
+        device_column (int): Zero-based index of the column containing device names
+        chunk_size (int): Number of rows read, looked up and written at a time
+        bulk (bool): Fetch the whole device inventory once instead of querying each device
+        workers (int): Number of concurrent API requests
+        rate_limit (float): Maximum number of API requests per second (default: unlimited)
+        retries (int): Number of retries for connection errors and 429/5xx responses
+        connect_timeout (float): Timeout in seconds for establishing a connection to the API
+        read_timeout (float): Timeout in seconds for reading an API response
+        cache_file (str): Path to the persistent device cache (default: DEFAULT_CACHE_FILE)
+        cache_ttl (float): Number of seconds cached device records stay valid (0 disables the cache)
+        negative_cache_ttl (float): Number of seconds cached "not found" results stay valid
+        refresh (bool): Ignore cached device records and query the API again
+        dns_workers (int): Number of concurrent DNS lookups for devices not found in LibreNMS
+        abbreviations (dict): Abbreviation for each word that should not count as a location difference
+        fuzzy_threshold (float): Minimum similarity (0-1) for a non-compliant location to count as a fuzzy match
+        delta (bool): Only query devices whose last_polled or location changed since the previous delta run
+        snapshot_file (str): Path to the snapshot of the previous delta run (default: DEFAULT_SNAPSHOT_FILE)
+        apply (bool): Push the expected location of non-compliant devices to LibreNMS
+        dry_run (bool): With apply, only log and journal the location updates that would be made
+        apply_batch_size (int): Number of location updates sent before progress is reported
+        apply_near_misses (bool): With apply, also update devices whose location is a normalized or fuzzy match
+        timings (RunTimings): Collector for the end-of-run timing report (default: a new one)
+    """
+    # Check if file exists
+    if not os.path.exists(input_path):
+        logger.error(f"Error: File {input_path} not found")
+        sys.exit(1)
+    
+    input_format = detect_file_format(input_path)
+    output_format = detect_file_format(output_path)
+    if input_format not in ('csv', 'parquet', 'jsonl') or output_format not in ('csv', 'parquet', 'jsonl'):
+        logger.error("Error: Input and output files must be .csv, .parquet or .jsonl files")
+        sys.exit(1)
+    
+    # Initialize LibreNMS client
+    timings = timings or RunTimings()
+    client = create_client(api_url, api_token, bulk=bulk, workers=workers, rate_limit=rate_limit, retries=retries,
+                           connect_timeout=connect_timeout, read_timeout=read_timeout, cache_file=cache_file,
+                           cache_ttl=cache_ttl, negative_cache_ttl=negative_cache_ttl, refresh=refresh,
+                           delta=delta, snapshot_file=snapshot_file, timings=timings)
+    resolver = DNSResolver(dns_workers, timings=timings)
+    matcher = LocationMatcher(location_format, abbreviations, fuzzy_threshold)
+    
+    try:
+        devices = {}
+        processed_count = found_count = not_found_count = compliant_count = non_compliant_count = 0
+        near_misses = {'normalized': 0, 'reordered': 0, 'fuzzy': 0}
+        fix_targets = {}
+        
+        input_schema = None
+        if input_format == 'parquet' and output_format == 'parquet':
+            import pyarrow.parquet as pq
+            input_schema = pq.read_schema(input_path)
+        
+        with TableOutput(output_path, output_format, input_schema) as output:
+            chunks = read_table_chunks(input_path, input_format, chunk_size)
+            chunk_idx = 0
+            while True:
+                with timings.phase('input read'):
+                    df = next(chunks, None)
+                if df is None:
+                    break
+                if df.empty:
+                    continue
+                chunk_idx += 1
+                logger.info(f"\nProcessing chunk {chunk_idx} (rows {df.index[0] + 1}-{df.index[-1] + 1})")
+                
+                # Identify the column containing device names
+                if device_column < 0 or device_column >= len(df.columns):
+                    device_col = df.columns[0]
+                else:
+                    device_col = df.columns[device_column]
+                
+                # Read the device names and expected locations before any result column is added
+                with timings.phase('template eval'):
+                    expected_locations = build_expected_locations(df, location_format)
+                    row_hostnames = build_full_hostnames(df[device_col], domain_suffix)
+                    keep_columns = add_result_columns(df, device_col, location_format)
+                    if expected_locations is not None and 'Expected_Location' not in keep_columns:
+                        df['Expected_Location'] = expected_locations.where(df.index.isin(row_hostnames.index), None)
+                
+                # Query the API for devices not seen in an earlier chunk; devices is keyed by the
+                # lowercased hostname, since hostnames are case-insensitive
+                new_hostnames = {}
+                for hostname in row_hostnames.unique():
+                    if hostname.lower() not in devices:
+                        new_hostnames.setdefault(hostname.lower(), hostname)
+                with timings.phase('API and DNS lookups'):
+                    new_devices, dns_results = lookup_pipeline(client, resolver, list(new_hostnames.values()),
+                                                               workers)
+                devices.update((hostname.lower(), device_info) for hostname, device_info in new_devices.items())
+                
+                # Devices not found in an earlier chunk are answered from the resolver's cache
+                chunk_devices = {hostname: devices[hostname.lower()] for hostname in row_hostnames.unique()}
+                dns_results.update(resolver.resolve_many(
+                    [hostname for hostname, device_info in chunk_devices.items()
+                     if not device_info and hostname not in dns_results]))
+                
+                with timings.phase('result merge'):
+                    counts = merge_results(df, row_hostnames, chunk_devices, dns_results, expected_locations, matcher,
+                                           keep_columns)
+                processed_count += len(row_hostnames)
+                found_count += counts['found']
+                not_found_count += counts['not_found']
+                compliant_count += counts['compliant']
+                non_compliant_count += counts['non_compliant']
+                for match in near_misses:
+                    near_misses[match] += counts[match]
+                if apply:
+                    collect_location_fixes(df, row_hostnames, fix_targets)
+                
+                with timings.phase('output write'):
+                    output.write(df)
+        
+        if chunk_idx == 0:
+            logger.warning(f"  Warning: '{input_path}' has no rows, nothing to audit")
+        
+        logger.info(f"\n  Summary for '{input_path}':\n")
+        logger.info(f"    Total devices processed: {processed_count}")
+        logger.info(f"    Devices found in LibreNMS: {found_count}")
+        logger.info(f"    Devices not found in LibreNMS: {not_found_count}")
+        if location_format:
+            logger.info(f"    Devices with compliant location: {compliant_count}")
+            logger.info(f"    Devices with non-compliant location: {non_compliant_count}")
+            logger.info(f"      Near misses: {near_misses['normalized']} normalized, {near_misses['reordered']} reordered, "
+                        f"{near_misses['fuzzy']} fuzzy")
+        
+        # Push the expected locations of non-compliant devices to LibreNMS
+        if apply:
+            apply_journal = ApplyJournal(f"{output_path}.apply.jsonl")
+            logger.info(f"\n{'Checking' if dry_run else 'Updating'} {len(fix_targets)} device locations in LibreNMS...")
+            with timings.phase('location write-back'):
+                fix_counts = apply_location_fixes(client, fix_targets, devices, apply_journal, workers, dry_run,
+                                                  apply_batch_size, apply_near_misses)
+            apply_journal.close()
+            report_location_fixes(fix_counts, apply_journal.path, dry_run)
+        timings.report()
+        logger.info(f"\nResults saved to {output_path}")
+        client.close()
+        
+    except ImportError as e:
+        logger.error(f"Error: Parquet files require pyarrow (pip install pyarrow): {str(e)}")
+        sys.exit(1)
+    except PermissionError:
+        logger.error(f"Error: Permission denied when accessing {output_path}. Make sure the file is not open in another program.")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(f"Error processing {input_path}: {str(e)}")
+        sys.exit(1)
+
+def add_result_columns(df, device_col, location_format):
+    """
+    Add the result columns to a sheet without touching the columns its devices are read from
     
-    def get_device_info(self, hostname):
-        """
-        Get device information from the LibreNMS API
+    Result columns left by a previous run are cast to object, since re-read columns can have
+    numeric dtypes that cannot hold the new values. An input column (the device column or a
+    column referenced by the location format) with the name of a result column is kept as is.
+    
+    Args:
+        df (pandas.DataFrame): Sheet data, updated in place
+        device_col (str): Name of the column containing device names
+        location_format (str): Format template with column references (e.g., $B.$C$E.$F)
         
-        Args:
-            hostname (str): Hostname of the device to query
-            
-        Returns:
-            dict: Device information or None if not found
-        """
-        url = f"{self.api_url}/api/v0/devices/{hostname}"
-        try:
-            response = requests.get(url, headers=self.headers, verify=self.verify_ssl, timeout=30)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('status') == 'ok' and data.get('devices') and len(data['devices']) > 0:
-                    return data['devices'][0]
-                else:
-                    print(f"  API returned no device data for {hostname}")
-            else:
-                print(f"  API returned status code {response.status_code} for {hostname}")
-                if response.status_code == 401:
-                    print("  Authentication error. Check your API token.")
-                elif response.status_code == 404:
-                    print("  Device not found in LibreNMS.")
-            return None
-        except requests.exceptions.Timeout:
-            print(f"Error: API request timed out for {hostname}")
-            return None
-        except requests.exceptions.ConnectionError:
-            print(f"Error: Could not connect to API server at {self.api_url}")
-            return None
-        except Exception as e:
-            print(f"Error querying API for {hostname}: {str(e)}")
-            return None
+    Returns:
+        set: Result columns that are also input columns; merge_results leaves them unchanged
+    """
+    input_columns = {device_col}
+    for col_ref in re.findall(r'\$([A-Z]+)', location_format or ''):
+        col_idx = column_index(col_ref)
+        if col_idx < len(df.columns):
+            input_columns.add(df.columns[col_idx])
+    
+    keep_columns = input_columns & set(RESULT_COLUMNS)
+    for col in RESULT_COLUMNS:
+        if col in keep_columns:
+            logger.warning(f"  Warning: Input column '{col}' has the name of a result column; "
+                           f"its values are kept and the {col} result is not written")
+        elif col in df.columns:
+            df[col] = df[col].astype(object)
+        else:
+            df[col] = None
+    return keep_columns
 
-def build_expected_location(row, df_columns, format_template):
+def prepare_sheet(sheet_name, df, device_column, location_format, domain_suffix):
     """
-    Build the expected location string from row data and format template
+    Add the result columns to a sheet and collect the devices to query
     
     Args:
-        row (pandas.Series): Row data from Excel
-        df_columns (list): List of column names from the DataFrame
-        format_template (str): Format template with column references (e.g., $B.$C$E.$F)
+        sheet_name (str): Name of the sheet
+        df (pandas.DataFrame): Sheet data, updated in place
+        device_column (int): Zero-based index of the column containing device names
+        location_format (str): Format template with column references (e.g., $B.$C$E.$F)
+        domain_suffix (str): Domain suffix to append to hostnames
         
     Returns:
-        str: Expected location string
+        tuple: (full hostname for each row with a device name, expected location for each row, result
+               columns that are also input columns), or (None, None, None) if the sheet is skipped
     """
-    if not format_template:
-        return None
+    # Check if the DataFrame is empty
+    if df.empty:
+        logger.warning(f"  Warning: Sheet '{sheet_name}' is empty, skipping")
+        return None, None, None
         
-    # Replace column references with actual values
-    result = format_template
+    # Check if there are any columns
+    if len(df.columns) == 0:
+        logger.warning(f"  Warning: Sheet '{sheet_name}' has no columns, skipping")
+        return None, None, None
     
-    # Find all column references (e.g., $B, $C, etc.)
-    col_refs = re.findall(r'\$([A-Z]+)', format_template)
+    # Identify the column containing device names
+    if device_column < 0 or device_column >= len(df.columns):
+        logger.warning(f"  Warning: Device column index {device_column} is out of range. Using first column instead.")
+        device_col = df.columns[0]
+    else:
+        device_col = df.columns[device_column]
     
-    for col_ref in col_refs:
-        # Convert column letter to column index (0-based)
-        col_idx = ord(col_ref) - ord('A')
-        
-        # Check if the column index is valid
-        if col_idx < 0 or col_idx >= len(df_columns):
-            print(f"Warning: Column {col_ref} (index {col_idx}) is out of range. Available columns: {len(df_columns)}")
-            # Replace with empty string to avoid template syntax in output
-            result = result.replace(f'${col_ref}', '')
-            continue
-        
-        # Get the column name and value
-        col_name = df_columns[col_idx]
-        
-        # Handle NaN values and convert to string
-        if pd.isna(row[col_name]):
-            col_value = ''
-        else:
-            # Convert to string and strip whitespace
-            col_value = str(row[col_name]).strip()
-        
-        # Replace column reference with its value
-        result = result.replace(f'${col_ref}', col_value)
+    logger.info(f"  Using column '{device_col}' for device names")
     
-    # Clean up any potential double periods from empty values
-    result = re.sub(r'\.\s*\.', '.', result)
-    result = re.sub(r'^\.|\.$', '', result)  # Remove leading/trailing periods
+    # Build expected locations from column references and collect the devices to query
+    # before any result column is added
+    expected_locations = build_expected_locations(df, location_format)
+    row_hostnames = build_full_hostnames(df[device_col], domain_suffix)
+    keep_columns = add_result_columns(df, device_col, location_format)
+    if expected_locations is not None and 'Expected_Location' not in keep_columns:
+        df['Expected_Location'] = expected_locations.where(df.index.isin(row_hostnames.index), None)
+    logger.info(f"  Found {len(row_hostnames)} devices in sheet '{sheet_name}'")
     
-    return result
+    return row_hostnames, expected_locations, keep_columns
 
-def perform_dns_lookup(hostname):
+def read_sheets(excel_path, sheet_names, excel_engine, device_column, location_format, domain_suffix):
     """
-    Perform DNS lookup for a hostname
+    Read and prepare a group of sheets from one workbook handle; runs in a worker process when
+    --processes is used
     
     Args:
-        hostname (str): Hostname to lookup
+        excel_path (str): Path to the Excel file
+        sheet_names (list): Names of the sheets to read
+        excel_engine (str): pandas engine used to read the workbook (default: openpyxl)
+        device_column (int): Zero-based index of the column containing device names
+        location_format (str): Format template with column references (e.g., $B.$C$E.$F)
+        domain_suffix (str): Domain suffix to append to hostnames
         
     Returns:
-        tuple: (IP address, status message)
+        list: (sheet name, sheet data, full hostname for each row, expected location for each row,
+              result columns that are also input columns) for each sheet
     """
-    try:
-        # Try using subprocess to run nslookup (more reliable with different DNS configurations)
-        result = subprocess.run(['nslookup', hostname], capture_output=True, text=True, timeout=5)
-        output = result.stdout
-        
-        # Check if the lookup was successful
-        if "NXDOMAIN" in output or "can't find" in output:
-            return None, "Not found in DNS"
-        
-        # Extract IP address from nslookup output
-        ip_match = re.search(r'Address:\s+(\d+\.\d+\.\d+\.\d+)(?!#)', output)
-        if ip_match:
-            return ip_match.group(1), "Found in DNS"
-            
-        # Fallback to socket.gethostbyname if nslookup doesn't provide clear results
-        try:
-            ip = socket.gethostbyname(hostname)
-            return ip, "Found in DNS"
-        except socket.gaierror:
-            return None, "Not found in DNS"
-            
-    except subprocess.TimeoutExpired:
-        return None, "DNS lookup timeout"
-    except Exception as e:
-        print(f"      DNS lookup error: {str(e)}")
-        return None, "DNS lookup error"
+    sheets = []
+    with pd.ExcelFile(excel_path, engine=excel_engine) as excel_file:
+        for sheet_name in sheet_names:
+            df = excel_file.parse(sheet_name, dtype=object)
+            sheets.append((sheet_name, df) + prepare_sheet(sheet_name, df, device_column, location_format,
+                                                           domain_suffix))
+    return sheets
 
-def is_location_compliant(location, expected_location):
+def finish_sheet(df, row_hostnames, devices, dns_results, expected_locations, matcher=None, keep_columns=()):
     """
-    Check if the location string matches the expected location
+    Merge the lookup results into a sheet and measure its column widths
     
     Args:
-        location (str): Location string from API
-        expected_location (str): Expected location string built from column references
+        df (pandas.DataFrame): Sheet data, updated in place
+        row_hostnames (pandas.Series): Full hostname for each row that was looked up, indexed like df
+        devices (dict): Device information (or None if not found) for each hostname in the sheet
+        dns_results (dict): (IP address, status message, IPv6 addresses) for each hostname not found in LibreNMS
+        expected_locations (pandas.Series): Expected location for each row, or None if there is no template
+        matcher (LocationMatcher): Matcher used to classify non-compliant locations
+        keep_columns (set): Result columns that are also input columns of the sheet
         
     Returns:
-        bool: True if compliant, False otherwise
+        tuple: (processed sheet data, counts from merge_results, column widths)
     """
-    if not location or not expected_location:
-        return False
-    
-    # Remove any extra whitespace and convert to lowercase for comparison
-    location = location.strip().lower()
-    expected_location = expected_location.strip().lower()
-    
-    return location == expected_location
+    counts = merge_results(df, row_hostnames, devices, dns_results, expected_locations, matcher, keep_columns)
+    return df, counts, column_widths(df)
 
-def process_excel_file(excel_path, api_url, api_token, location_format, domain_suffix=".sac.ragingwire.net", device_column=0):
+def process_excel_file(excel_path, api_url, api_token, location_format, domain_suffix=".sac.ragingwire.net", device_column=0,
+                       bulk=False, workers=1, rate_limit=None, retries=3, connect_timeout=5, read_timeout=30,
+                       cache_file=None, cache_ttl=0, negative_cache_ttl=300, refresh=False, dns_workers=10,
+                       write_only=False, excel_engine=None, resume=False, incremental=False, processes=1,
+                       abbreviations=None, fuzzy_threshold=0.8, delta=False, snapshot_file=None, apply=False,
+                       dry_run=False, apply_batch_size=100, apply_near_misses=False, timings=None, client=None):
     """
     Process the Excel file, query the API for each device, and update the Excel file
     
@@ -191,353 +2368,712 @@ def process_excel_file(excel_path, api_url, api_token, location_format, domain_s
         location_format (str): Format template with column references (e.g., $B.$C$E.$F)
         domain_suffix (str): Domain suffix to append to hostnames
         device_column (int): Zero-based index of the column containing device names
+        bulk (bool): Fetch the whole device inventory once instead of querying each device
+        workers (int): Number of concurrent API requests
+        rate_limit (float): Maximum number of API requests per second (default: unlimited)
+        retries (int): Number of retries for connection errors and 429/5xx responses
+        connect_timeout (float): Timeout in seconds for establishing a connection to the API
+        read_timeout (float): Timeout in seconds for reading an API response
+        cache_file (str): Path to the persistent device cache (default: DEFAULT_CACHE_FILE)
+        cache_ttl (float): Number of seconds cached device records stay valid (0 disables the cache)
+        negative_cache_ttl (float): Number of seconds cached "not found" results stay valid
+        refresh (bool): Ignore cached device records and query the API again
+        dns_workers (int): Number of concurrent DNS lookups for devices not found in LibreNMS
+        write_only (bool): Rewrite the workbook in openpyxl write-only mode instead of updating it in place
+        excel_engine (str): pandas engine used to read the workbook (default: openpyxl)
+        resume (bool): Skip rows already looked up according to the checkpoint journal of a previous run
+        incremental (bool): Only query rows whose device name or expected location changed since the
+                            previous run, or whose device was not found
+        processes (int): Number of worker processes used to read and prepare the sheets
+        abbreviations (dict): Abbreviation for each word that should not count as a location difference
+        fuzzy_threshold (float): Minimum similarity (0-1) for a non-compliant location to count as a fuzzy match
+        delta (bool): Only query devices whose last_polled or location changed since the previous delta run
+        snapshot_file (str): Path to the snapshot of the previous delta run (default: DEFAULT_SNAPSHOT_FILE)
+        apply (bool): Push the expected location of non-compliant devices to LibreNMS
+        dry_run (bool): With apply, only log and journal the location updates that would be made
+        apply_batch_size (int): Number of location updates sent before progress is reported
+        apply_near_misses (bool): With apply, also update devices whose location is a normalized or fuzzy match
+        timings (RunTimings): Collector for the end-of-run timing report (default: a new one)
+        client (LibreNMSClient): Client to reuse, e.g. the warm client of the service mode; it is left
+                                 open (default: a new client, closed at the end of the run)
     """
     # Check if file exists
     if not os.path.exists(excel_path):
-        print(f"Error: File {excel_path} not found")
+        logger.error(f"Error: File {excel_path} not found")
         sys.exit(1)
     
     # Create a backup of the original file
     backup_path = f"{excel_path}.bak"
     if os.path.exists(excel_path):
-        import shutil
         shutil.copy2(excel_path, backup_path)
-        print(f"Backup created at {backup_path}")
+        logger.info(f"Backup created at {backup_path}")
     
     # Initialize LibreNMS client
-    client = LibreNMSClient(api_url, api_token)
+    timings = timings or RunTimings()
+    own_client = client is None
+    if own_client:
+        client = create_client(api_url, api_token, bulk=bulk, workers=workers, rate_limit=rate_limit, retries=retries,
+                               connect_timeout=connect_timeout, read_timeout=read_timeout, cache_file=cache_file,
+                               cache_ttl=cache_ttl, negative_cache_ttl=negative_cache_ttl, refresh=refresh,
+                               delta=delta, snapshot_file=snapshot_file, timings=timings)
+    resolver = DNSResolver(dns_workers, timings=timings)
+    matcher = LocationMatcher(location_format, abbreviations, fuzzy_threshold)
+    
+    # Record every completed lookup so an interrupted run can be resumed
+    journal = CheckpointJournal(f"{excel_path}.journal", keep=resume or incremental)
     
     # Read the Excel file - get all sheet names
     try:
-        # Get all sheet names
-        excel_file = pd.ExcelFile(excel_path)
+        # Open the workbook once and parse each sheet from the same handle
+        excel_file = pd.ExcelFile(excel_path, engine=excel_engine)
         sheet_names = excel_file.sheet_names
         
         if not sheet_names:
-            print(f"Error: Excel file {excel_path} has no sheets")
+            logger.error(f"Error: Excel file {excel_path} has no sheets")
             sys.exit(1)
             
-        print(f"Found {len(sheet_names)} sheets in the Excel file: {', '.join(sheet_names)}")
-        
-        # Create a writer to save to Excel with formatting
-        from openpyxl import load_workbook
-        from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+        logger.info(f"Found {len(sheet_names)} sheets in the Excel file: {', '.join(sheet_names)}")
         
-        # Process each sheet
-        with pd.ExcelWriter(excel_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            total_sheets = len(sheet_names)
-            
+        # Scan every sheet first so each device is only looked up once for the whole workbook
+        total_sheets = len(sheet_names)
+        sheets = []
+        if processes > 1:
+            # Worker processes read and prepare the sheets in parallel; results are kept in sheet order
+            # Each worker opens the workbook once for its whole group of sheets
+            audited_sheets = [sheet_name for sheet_name in sheet_names if sheet_name != 'Summary']
+            groups = [group for group in (audited_sheets[start::processes] for start in range(processes)) if group]
+            logger.info(f"\nReading {len(audited_sheets)} sheets in {len(groups)} processes")
+            json_format = any(isinstance(handler.formatter, JsonFormatter) for handler in logger.handlers)
+            with timings.phase('workbook load and template eval'), \
+                    ProcessPoolExecutor(max_workers=len(groups) or 1, initializer=configure_logging,
+                                        initargs=(logging.getLevelName(logger.getEffectiveLevel()),
+                                                  json_format)) as pool:
+                futures = [pool.submit(read_sheets, excel_path, group, excel_engine, device_column,
+                                       location_format, domain_suffix) for group in groups]
+                read = {sheet[0]: sheet for future in futures for sheet in future.result()}
+            sheets = [read[sheet_name] for sheet_name in audited_sheets]
+        else:
             for sheet_idx, sheet_name in enumerate(sheet_names):
-                print(f"\nProcessing sheet {sheet_idx+1}/{total_sheets}: '{sheet_name}'")
+                logger.info(f"\nReading sheet {sheet_idx+1}/{total_sheets}: '{sheet_name}'")
                 
-                # Read the sheet
-                df = pd.read_excel(excel_path, sheet_name=sheet_name)
-                
-                # Check if the DataFrame is empty
-                if df.empty:
-                    print(f"  Warning: Sheet '{sheet_name}' is empty, skipping")
-                    continue
-                    
-                # Check if there are any columns
-                if len(df.columns) == 0:
-                    print(f"  Warning: Sheet '{sheet_name}' has no columns, skipping")
+                # The summary sheet of a previous run is regenerated, not audited
+                if sheet_name == 'Summary':
+                    logger.info("  Skipping summary sheet from a previous run")
                     continue
                 
-                # Identify the column containing device names
-                if device_column < 0 or device_column >= len(df.columns):
-                    print(f"  Warning: Device column index {device_column} is out of range. Using first column instead.")
-                    device_col = df.columns[0]
+                # Read the sheet
+                # Cells are kept as stored, so text such as '01' is not turned into a number
+                with timings.phase('workbook load'):
+                    df = excel_file.parse(sheet_name, dtype=object)
+                with timings.phase('template eval'):
+                    sheets.append((sheet_name, df) + prepare_sheet(sheet_name, df, device_column, location_format,
+                                                                   domain_suffix))
+        
+        # Release the input workbook before the output is saved over it
+        excel_file.close()
+        
+        # Reuse lookups from the checkpoint journal where possible. Hostnames are case-insensitive,
+        # so devices and query_rows are keyed by the lowercased hostname and each device is queried
+        # once, with the first spelling found
+        devices = {}
+        query_rows = {}
+        query_hostnames = {}
+        for sheet_name, df, row_hostnames, expected_locations, keep_columns in sheets:
+            if row_hostnames is None:
+                continue
+            journal_records = journal.sheet_records(sheet_name) if resume or incremental else {}
+            for idx, full_hostname in row_hostnames.items():
+                key = full_hostname.lower()
+                record = journal_records.get(int(idx))
+                expected_location = expected_locations.at[idx] if expected_locations is not None else ''
+                if record and record['hostname'].lower() == key and (
+                        resume or (record['expected'] == expected_location and record['device'])):
+                    devices.setdefault(key, record['device'])
                 else:
-                    device_col = df.columns[device_column]
-                
-                print(f"  Using column '{device_col}' for device names")
-                
-                # Define the new columns to add
-                new_columns = ['hostname', 'ip', 'sysDescr', 'hardware', 'os', 'version', 
-                              'last_polled', 'location', 'Expected_Location', 'Compliant', 'Status', 'DNS_IP', 'DNS_Status']
-                
-                # Add new columns to the DataFrame
-                for col in new_columns:
-                    if col not in df.columns:
-                        df[col] = None
-                
-                # Process each row
-                total_rows = len(df)
-                processed_count = 0
-                found_count = 0
-                not_found_count = 0
-                compliant_count = 0
-                non_compliant_count = 0
-                
-                print(f"  Processing {total_rows} devices...")
-                
-                for idx, row in df.iterrows():
-                    device_name = str(row[device_col]).strip()
-                    if not device_name or pd.isna(device_name):
-                        continue
-                    
-                    processed_count += 1
-                    progress = (processed_count / total_rows) * 100
-                    if processed_count % 5 == 0 or processed_count == total_rows:
-                        print(f"  Progress: {processed_count}/{total_rows} ({progress:.1f}%)")
-                    
-                    # Handle domain suffix
-                    # First, check if device_name already has any domain suffix
-                    if '.' in device_name:
-                        hostname_parts = device_name.split('.')
-                        # If it has fewer than 2 parts, it's not a valid FQDN
-                        if len(hostname_parts) < 2:
-                            # Add the domain suffix
-                            full_hostname = f"{device_name}{domain_suffix}"
-                        else:
-                            # Use the device name as is, assuming it already has a domain
-                            full_hostname = device_name
-                    else:
-                        # No dots in the name, add the domain suffix
-                        full_hostname = f"{device_name}{domain_suffix}"
-                    
-                    # Build expected location from column references
-                    expected_location = ''
-                    if location_format:
-                        expected_location = build_expected_location(row, df.columns.tolist(), location_format)
-                        df.at[idx, 'Expected_Location'] = expected_location if expected_location else ''
-                    
-                    # Query the API
-                    print(f"    Querying API for device: {full_hostname}")
-                    device_info = client.get_device_info(full_hostname)
-                    
-                    # Update the row with the API response data
-                    if device_info:
-                        found_count += 1
-                        df.at[idx, 'hostname'] = device_info.get('hostname', '')
-                        df.at[idx, 'ip'] = device_info.get('ip', '')
-                        df.at[idx, 'sysDescr'] = device_info.get('sysDescr', '')
-                        df.at[idx, 'hardware'] = device_info.get('hardware', '')
-                        df.at[idx, 'os'] = device_info.get('os', '')
-                        df.at[idx, 'version'] = device_info.get('version', '')
-                        df.at[idx, 'last_polled'] = device_info.get('last_polled', '')
-                        
-                        # Get location and check compliance
-                        location = device_info.get('location', '')
-                        df.at[idx, 'location'] = location
-                        
-                        # Check if location is compliant with the expected format
-                        is_compliant = False
-                        if expected_location:
-                            is_compliant = is_location_compliant(location, expected_location)
-                            if is_compliant:
-                                compliant_count += 1
-                            else:
-                                non_compliant_count += 1
-                        
-                        df.at[idx, 'Compliant'] = 'Yes' if is_compliant else 'No'
-                        df.at[idx, 'Status'] = 'Found'
-                        
-                        print(f"      Found device information")
-                        print(f"      Location: {location}")
-                        if expected_location:
-                            print(f"      Expected Location: {expected_location}")
-                            print(f"      Compliant: {'Yes' if is_compliant else 'No'}")
-                    else:
-                        not_found_count += 1
-                        df.at[idx, 'Status'] = 'Not found in LibreNMS'
-                        print(f"      Device not found in LibreNMS")
-                        
-                        # Try DNS lookup for devices not found in LibreNMS
-                        print(f"      Attempting DNS lookup for {full_hostname}...")
-                        dns_ip, dns_status = perform_dns_lookup(full_hostname)
-                        df.at[idx, 'DNS_IP'] = dns_ip
-                        df.at[idx, 'DNS_Status'] = dns_status
-                        print(f"      DNS lookup result: {dns_status} {dns_ip if dns_ip else ''}")
+                    query_rows.setdefault(key, []).append((sheet_name, int(idx), full_hostname, expected_location))
+                    query_hostnames.setdefault(key, full_hostname)
+        for full_hostname in query_rows:
+            devices.pop(full_hostname, None)
+        if devices:
+            logger.info(f"\nReusing {len(devices)} devices from checkpoint journal {journal.path}")
+        
+        def checkpoint(full_hostname, device_info, dns_result):
+            for sheet_name, row, row_hostname, expected_location in query_rows[full_hostname.lower()]:
+                journal.record(sheet_name, row, row_hostname, expected_location, device_info)
+        
+        # Query the API once per distinct device; devices not found in LibreNMS are resolved in DNS
+        # as soon as their lookup comes back, while the remaining API requests are still in flight
+        unique_hostnames = list(query_hostnames.values())
+        total_references = sum(len(sheet[2]) for sheet in sheets if sheet[2] is not None)
+        logger.info(f"\nQuerying API for {len(unique_hostnames)} devices...")
+        with timings.phase('API and DNS lookups'):
+            queried_devices, dns_results = lookup_pipeline(client, resolver, unique_hostnames, workers,
+                                                           on_result=checkpoint)
+        devices.update((hostname.lower(), device_info) for hostname, device_info in queried_devices.items())
+        dns_results = {hostname.lower(): dns_result for hostname, dns_result in dns_results.items()}
+        
+        # Devices reused from the journal that were not found still need a DNS lookup
+        reused_not_found = [hostname for hostname, device_info in devices.items()
+                            if not device_info and hostname not in dns_results]
+        if reused_not_found:
+            logger.info(f"Performing DNS lookup for {len(reused_not_found)} devices not found in LibreNMS...")
+            with timings.phase('DNS lookups'):
+                dns_results.update(resolver.resolve_many(reused_not_found))
+        
+        # Per-sheet counters for the summary sheet
+        summary_data = {
+            'Sheet Name': [],
+            'Total Devices': [],
+            'Devices Found': [],
+            'Devices Not Found': [],
+            'Compliant Locations': [],
+            'Non-Compliant Locations': [],
+            'Processed Date': []
+        }
+        
+        # Fan the results back out to every row that references a device
+        finish_args = []
+        for sheet_name, df, row_hostnames, expected_locations, keep_columns in sheets:
+            if row_hostnames is None:
+                continue
+            sheet_devices = {hostname: devices[hostname.lower()] for hostname in row_hostnames.unique()}
+            sheet_dns_results = {hostname: dns_results[hostname.lower()]
+                                 for hostname, device_info in sheet_devices.items() if not device_info}
+            finish_args.append((df, row_hostnames, sheet_devices, sheet_dns_results, expected_locations, matcher,
+                                keep_columns))
+        
+        # Update the rows with the API response data and check compliance
+        with timings.phase('result merge'):
+            finished = iter([finish_sheet(*args) for args in finish_args])
+        
+        processed_sheets = []
+        for sheet_name, df, row_hostnames, expected_locations, keep_columns in sheets:
+            if row_hostnames is None:
+                processed_sheets.append((sheet_name, df, None))
+                continue
+            df, counts, widths = next(finished)
+            processed_sheets.append((sheet_name, df, widths))
+            total_rows = len(df)
+            processed_count = len(row_hostnames)
+            found_count = counts['found']
+            not_found_count = counts['not_found']
+            compliant_count = counts['compliant']
+            non_compliant_count = counts['non_compliant']
+            
+            # Print summary for this sheet
+            logger.info(f"\n  Summary for sheet '{sheet_name}':\n")
+            logger.info(f"    Total devices processed: {processed_count}")
+            logger.info(f"    Devices found in LibreNMS: {found_count}")
+            logger.info(f"    Devices not found in LibreNMS: {not_found_count}")
+            if location_format:
+                logger.info(f"    Devices with compliant location: {compliant_count}")
+                logger.info(f"    Devices with non-compliant location: {non_compliant_count}")
+                logger.info(f"      Near misses: {counts['normalized']} normalized, {counts['reordered']} reordered, "
+                            f"{counts['fuzzy']} fuzzy")
+            
+            # Add to summary data
+            summary_data['Sheet Name'].append(sheet_name)
+            summary_data['Total Devices'].append(total_rows)
+            summary_data['Devices Found'].append(found_count)
+            summary_data['Devices Not Found'].append(not_found_count)
+            summary_data['Compliant Locations'].append(compliant_count)
+            summary_data['Non-Compliant Locations'].append(non_compliant_count)
+            summary_data['Processed Date'].append(pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'))
+        
+        # Create summary DataFrame
+        summary_df = pd.DataFrame(summary_data)
+        
+        # Add a row with totals
+        totals = {
+            'Sheet Name': 'TOTAL',
+            'Total Devices': summary_df['Total Devices'].sum(),
+            'Devices Found': summary_df['Devices Found'].sum(),
+            'Devices Not Found': summary_df['Devices Not Found'].sum(),
+            'Compliant Locations': summary_df['Compliant Locations'].sum(),
+            'Non-Compliant Locations': summary_df['Non-Compliant Locations'].sum(),
+            'Processed Date': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        summary_df = pd.concat([summary_df, pd.DataFrame([totals])], ignore_index=True)
+        
+        # Write each sheet and the summary sheet
+        with timings.phase('write and styling'), ExcelOutput(excel_path, write_only=write_only) as output:
+            for sheet_name, df, widths in processed_sheets:
+                if widths is None:
+                    output.keep_sheet(sheet_name, df)
+                    continue
                 
                 # Save the DataFrame to the Excel file
-                print(f"  Saving sheet '{sheet_name}' to Excel file...")
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                
-                # Apply formatting to the sheet
-                worksheet = writer.sheets[sheet_name]
-                
-                # Define styles
-                header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-                header_font = Font(bold=True, color="FFFFFF")
-                compliant_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-                non_compliant_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-                not_found_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-                
-                # Format headers
-                for col_idx, column in enumerate(df.columns, 1):
-                    cell = worksheet.cell(row=1, column=col_idx)
-                    cell.fill = header_fill
-                    cell.font = header_font
-                
-                # Format data rows
-                for row_idx, row in enumerate(df.itertuples(), 2):  # Start from row 2 (after header)
-                    # Get the status and compliant values
-                    status_idx = df.columns.get_loc('Status') + 1 if 'Status' in df.columns else None
-                    compliant_idx = df.columns.get_loc('Compliant') + 1 if 'Compliant' in df.columns else None
-                    
-                    if status_idx and hasattr(row, 'Status'):
-                        status_cell = worksheet.cell(row=row_idx, column=status_idx)
-                        status_value = getattr(row, 'Status', '')
-                        
-                        if status_value == 'Not found in LibreNMS':
-                            # Color the entire row for not found devices
-                            for col_idx in range(1, len(df.columns) + 1):
-                                worksheet.cell(row=row_idx, column=col_idx).fill = not_found_fill
-                    
-                    if compliant_idx and hasattr(row, 'Compliant'):
-                        compliant_cell = worksheet.cell(row=row_idx, column=compliant_idx)
-                        compliant_value = getattr(row, 'Compliant', '')
-                        
-                        if compliant_value == 'Yes':
-                            compliant_cell.fill = compliant_fill
-                        elif compliant_value == 'No':
-                            compliant_cell.fill = non_compliant_fill
-                
-                # Auto-adjust column widths
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-                
-                # Print summary for this sheet
-                print(f"\n  Summary for sheet '{sheet_name}':\n")
-                print(f"    Total devices processed: {processed_count}")
-                print(f"    Devices found in LibreNMS: {found_count}")
-                print(f"    Devices not found in LibreNMS: {not_found_count}")
-                if location_format:
-                    print(f"    Devices with compliant location: {compliant_count}")
-                    print(f"    Devices with non-compliant location: {non_compliant_count}")
+                logger.info(f"\nSaving sheet '{sheet_name}' to Excel file...")
+                output.write_sheet(sheet_name, df, widths)
             
             # Create a summary sheet
-            print(f"\nCreating summary sheet...")
-            
-            # Create a summary DataFrame
-            summary_data = {
-                'Sheet Name': [],
-                'Total Devices': [],
-                'Devices Found': [],
-                'Devices Not Found': [],
-                'Compliant Locations': [],
-                'Non-Compliant Locations': [],
-                'Processed Date': []
-            }
-            
-            # Collect summary data from all sheets
-            for sheet_name in sheet_names:
-                # Read the sheet again to get the latest data
-                try:
-                    sheet_df = pd.read_excel(excel_path, sheet_name=sheet_name)
-                    
-                    # Skip empty sheets
-                    if sheet_df.empty or len(sheet_df.columns) == 0:
-                        continue
-                    
-                    # Count devices
-                    total_devices = len(sheet_df)
-                    
-                    # Count found/not found devices
-                    if 'Status' in sheet_df.columns:
-                        found_devices = len(sheet_df[sheet_df['Status'] == 'Found'])
-                        not_found_devices = len(sheet_df[sheet_df['Status'] == 'Not found in LibreNMS'])
-                    else:
-                        found_devices = 0
-                        not_found_devices = 0
-                    
-                    # Count compliant/non-compliant locations
-                    if 'Compliant' in sheet_df.columns:
-                        compliant_locations = len(sheet_df[sheet_df['Compliant'] == 'Yes'])
-                        non_compliant_locations = len(sheet_df[sheet_df['Compliant'] == 'No'])
-                    else:
-                        compliant_locations = 0
-                        non_compliant_locations = 0
-                    
-                    # Add to summary data
-                    summary_data['Sheet Name'].append(sheet_name)
-                    summary_data['Total Devices'].append(total_devices)
-                    summary_data['Devices Found'].append(found_devices)
-                    summary_data['Devices Not Found'].append(not_found_devices)
-                    summary_data['Compliant Locations'].append(compliant_locations)
-                    summary_data['Non-Compliant Locations'].append(non_compliant_locations)
-                    summary_data['Processed Date'].append(pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'))
-                except Exception as e:
-                    print(f"  Warning: Could not read sheet '{sheet_name}' for summary: {str(e)}")
-            
-            # Create summary DataFrame
-            summary_df = pd.DataFrame(summary_data)
-            
-            # Add a row with totals
-            totals = {
-                'Sheet Name': 'TOTAL',
-                'Total Devices': summary_df['Total Devices'].sum(),
-                'Devices Found': summary_df['Devices Found'].sum(),
-                'Devices Not Found': summary_df['Devices Not Found'].sum(),
-                'Compliant Locations': summary_df['Compliant Locations'].sum(),
-                'Non-Compliant Locations': summary_df['Non-Compliant Locations'].sum(),
-                'Processed Date': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            summary_df = pd.concat([summary_df, pd.DataFrame([totals])], ignore_index=True)
-            
-            # Save summary to a new sheet
-            summary_df.to_excel(writer, sheet_name='Summary', index=False)
+            logger.info(f"\nCreating summary sheet...")
+            output.write_summary(summary_df)
+            logger.info(f"Summary sheet created")
+        
+        # Push the expected locations of non-compliant devices to LibreNMS
+        if apply:
+            fix_targets = {}
+            for sheet, (sheet_name, df, widths) in zip(sheets, processed_sheets):
+                if widths is not None:
+                    collect_location_fixes(df, sheet[2], fix_targets)
+            apply_journal = ApplyJournal(f"{excel_path}.apply.jsonl")
+            logger.info(f"\n{'Checking' if dry_run else 'Updating'} {len(fix_targets)} device locations in LibreNMS...")
+            with timings.phase('location write-back'):
+                fix_counts = apply_location_fixes(client, fix_targets, devices, apply_journal, workers, dry_run,
+                                                  apply_batch_size, apply_near_misses)
+            apply_journal.close()
+            report_location_fixes(fix_counts, apply_journal.path, dry_run)
+        
+        # Report how many rows shared a device lookup
+        unique_devices = len(set(devices))
+        if unique_devices:
+            logger.info(f"\n{total_references} device rows referenced {unique_devices} unique devices "
+                        f"(dedup ratio {total_references / unique_devices:.2f}:1)",
+                        extra={'device_rows': total_references, 'unique_devices': unique_devices})
+        timings.report()
+        logger.info(f"\nAll sheets processed and saved to {excel_path}")
+        if own_client:
+            client.close()
+        journal.close()
+        
+    except PermissionError:
+        logger.error(f"Error: Permission denied when accessing {excel_path}. Make sure the file is not open in another program.")
+        sys.exit(1)
+    except Exception as e:
+        logger.exception(f"Error processing Excel file: {str(e)}")
+        sys.exit(1)
+
+class LocationService:
+    """Answers location compliance checks from a warm, periodically refreshed device index"""
+    
+    def __init__(self, client, location_format=None, domain_suffix=".sac.ragingwire.net", device_column=0,
+                 matcher=None, resolver=None, workers=1, refresh_interval=300, job_options=None, job_retention=3600,
+                 max_upload_size=100 * 1024 * 1024):
+        """
+        Initialize the service
+        
+        Args:
+            client (LibreNMSClient): Client whose device index is kept warm; closed with the service
+            location_format (str): Format template used for records and uploaded workbooks
+            domain_suffix (str): Domain suffix to append to hostnames
+            device_column (int): Zero-based index of the field containing device names
+            matcher (LocationMatcher): Matcher used to classify locations (default: compiled from location_format)
+            resolver (DNSResolver): Resolver for devices not found in LibreNMS (default: a new resolver)
+            workers (int): Number of concurrent lookups for a batch check
+            refresh_interval (float): Number of seconds between inventory refreshes (0 disables refreshing)
+            job_options (dict): Extra keyword arguments for process_excel_file when processing uploaded workbooks
+            job_retention (float): Number of seconds a finished job and its workbook are kept if the result is
+                                   not downloaded
+            max_upload_size (int): Maximum size in bytes of a request body
+        """
+        self.client = client
+        self.location_format = location_format
+        self.domain_suffix = domain_suffix
+        self.device_column = device_column
+        self.matcher = matcher or LocationMatcher(location_format)
+        self.resolver = resolver or DNSResolver(1)
+        self.refresh_interval = refresh_interval
+        self.job_options = job_options or {}
+        self.job_retention = job_retention
+        self.max_upload_size = max_upload_size
+        self.refreshed_at = None
+        self.refresh_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.plans = {}
+        self.not_found = set()
+        self.check_executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        
+        # Uploaded workbooks are processed one at a time, in the order they were received
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.job_executor = ThreadPoolExecutor(max_workers=1)
+        self.job_dir = tempfile.mkdtemp(prefix='snmp_location_lookup_')
+    
+    def start(self):
+        """Build the device index and start refreshing it in the background"""
+        self.refresh()
+        if self.refresh_interval > 0:
+            threading.Thread(target=self._refresh_loop, name='index-refresh', daemon=True).start()
+    
+    def _refresh_loop(self):
+        while not self.stop_event.wait(self.refresh_interval):
+            self.refresh()
+    
+    def refresh(self):
+        """
+        Fetch the device inventory again and swap it in as the device index
+        
+        Checks keep being answered from the previous index while the inventory is fetched. Devices not
+        found in LibreNMS and their DNS results are forgotten at the same time, so they do not go stale.
+        
+        Returns:
+            int: Number of devices indexed, or None if the inventory could not be fetched
+        """
+        with self.refresh_lock:
+            start = time.perf_counter()
+            device_count = self.client.prefetch_devices(DEVICE_FIELDS)
+            if device_count is None:
+                logger.warning("Warning: Could not fetch device inventory, keeping the previous index")
+                return None
+            self.not_found = set()
+            self.resolver.clear()
+            self.refreshed_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+            logger.info(f"Indexed {device_count} devices in {time.perf_counter() - start:.2f}s",
+                        extra={'devices': device_count})
+            return device_count
+    
+    def close(self):
+        """Stop refreshing, wait for the running job and remove the uploaded workbooks"""
+        self.stop_event.set()
+        self.check_executor.shutdown()
+        self.job_executor.shutdown(cancel_futures=True)
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+        self.client.close()
+    
+    def health(self):
+        """
+        Describe the state of the device index and the workbook jobs
+        
+        Returns:
+            dict: Number of indexed devices, time of the last refresh and number of jobs in each state
+        """
+        device_index = self.client.device_index
+        self._expire_jobs()
+        with self.jobs_lock:
+            job_counts = {}
+            for job in self.jobs.values():
+                job_counts[job['status']] = job_counts.get(job['status'], 0) + 1
+        return {'status': 'ok', 'devices': len(device_index) if device_index is not None else None,
+                'refreshed_at': self.refreshed_at, 'jobs': job_counts}
+    
+    def get_device_info(self, hostname):
+        """
+        Get device information like LibreNMSClient.get_device_info, remembering devices that were not
+        found until the next refresh, so repeated checks of unmanaged hosts do not query the API again
+        
+        Args:
+            hostname (str): Hostname of the device to query
             
-            # Format the summary sheet
-            summary_worksheet = writer.sheets['Summary']
+        Returns:
+            dict: Device information or None if not found
+        """
+        key = hostname.strip().lower()
+        if key in self.not_found:
+            return None
+        device = self.client.get_device_info(hostname)
+        if device is None:
+            self.not_found.add(key)
+        return device
+    
+    def check(self, query):
+        """
+        Check the location compliance of a single device
+        
+        Args:
+            query (dict): 'hostname' and either 'expected_location' or 'record', the device's row as a list
+                          of values or a mapping in column order that is rendered with the location format
+                          (the device name is taken from the row when 'hostname' is missing)
             
-            # Define styles
-            header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF")
-            total_fill = PatternFill(start_color="DCE6F1", end_color="DCE6F1", fill_type="solid")
-            total_font = Font(bold=True)
+        Returns:
+            dict: 'device_name', 'lookup_hostname' and the value of each of RESULT_COLUMNS
             
-            # Format headers
-            for col_idx, column in enumerate(summary_df.columns, 1):
-                cell = summary_worksheet.cell(row=1, column=col_idx)
-                cell.fill = header_fill
-                cell.font = header_font
+        Raises:
+            ValueError: If the query is not an object, has no device name or has fields of the wrong type
+        """
+        if not isinstance(query, Mapping):
+            raise ValueError("a check must be a JSON object")
+        record = query.get('record')
+        values = None
+        if isinstance(record, Mapping):
+            values = list(record.values())
+        elif isinstance(record, list):
+            values = record
+        elif record is not None:
+            raise ValueError("'record' must be a list or an object")
+        
+        device_name = query.get('hostname')
+        if device_name is None and values is not None and self.device_column < len(values):
+            device_name = values[self.device_column]
+        if device_name is None or not str(device_name).strip():
+            raise ValueError("'hostname' is required")
+        device_name = str(device_name).strip()
+        
+        expected_location = query.get('expected_location')
+        if expected_location is not None and not isinstance(expected_location, str):
+            raise ValueError("'expected_location' must be a string")
+        if expected_location is None and values is not None and self.location_format:
+            # The plan only depends on the number of columns, so it is compiled once per row width
+            plan = self.plans.get(len(values))
+            if plan is None:
+                plan = self.plans[len(values)] = compile_location_template(self.location_format, values)
+            expected_location = render_location(plan, values)
+        
+        result = audit_record(None, device_name, expected_location, self, self.resolver, self.matcher,
+                              self.domain_suffix)
+        return {'device_name': device_name, 'lookup_hostname': result.hostname, **result.to_dict()}
+    
+    def check_many(self, queries):
+        """
+        Check the location compliance of several devices
+        
+        Args:
+            queries (list): Queries as accepted by check
             
-            # Format totals row
-            for col_idx in range(1, len(summary_df.columns) + 1):
-                cell = summary_worksheet.cell(row=len(summary_df) + 1, column=col_idx)
-                cell.fill = total_fill
-                cell.font = total_font
+        Returns:
+            list: Result of check for each query, in order, or {'error': message} for a query that failed
+        """
+        def check_or_error(query):
+            try:
+                return self.check(query)
+            except ValueError as e:
+                return {'error': str(e)}
+            except Exception as e:
+                # One failing device does not fail the whole batch
+                logger.exception(f"Error checking {query!r}: {str(e)}")
+                return {'error': f"internal error: {str(e)}"}
+        
+        return list(self.check_executor.map(check_or_error, queries))
+    
+    def submit_job(self, data):
+        """
+        Queue an uploaded workbook for processing with process_excel_file
+        
+        Args:
+            data (bytes): Contents of the .xlsx workbook
             
-            # Auto-adjust column widths
-            for column in summary_worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                summary_worksheet.column_dimensions[column_letter].width = adjusted_width
+        Returns:
+            dict: Status of the new job
+        """
+        self._expire_jobs()
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.job_dir, f"{job_id}.xlsx")
+        with open(path, 'wb') as f:
+            f.write(data)
+        job = {'id': job_id, 'status': 'queued', 'submitted_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'finished_at': None, 'error': None, 'path': path, 'expires': None}
+        with self.jobs_lock:
+            self.jobs[job_id] = job
+        self.job_executor.submit(self._run_job, job)
+        logger.info(f"Queued workbook job {job_id} ({len(data)} bytes)", extra={'job': job_id})
+        return self.job_status(job_id)
+    
+    def _run_job(self, job):
+        job['status'] = 'running'
+        try:
+            process_excel_file(job['path'], self.client.api_url, None, self.location_format, self.domain_suffix,
+                               self.device_column, client=self.client, **self.job_options)
+            job['status'] = 'done'
+        except (Exception, SystemExit) as e:
+            # process_excel_file logs the cause and exits on errors
+            job['status'] = 'failed'
+            job['error'] = str(e) if not isinstance(e, SystemExit) else 'processing failed, see the service log'
+        job['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        job['expires'] = time.monotonic() + self.job_retention
+        logger.info(f"Workbook job {job['id']} {job['status']}", extra={'job': job['id']})
+    
+    def job_status(self, job_id):
+        """
+        Get the status of a workbook job
+        
+        Args:
+            job_id (str): Job ID returned by submit_job
             
-            print(f"Summary sheet created")
-            print(f"\nAll sheets processed and saved to {excel_path}")
+        Returns:
+            dict: Status of the job, or None if there is no such job
+        """
+        self._expire_jobs()
+        with self.jobs_lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key not in ('path', 'expires')}
+    
+    def job_result(self, job_id):
+        """
+        Get the processed workbook of a finished job and remove the job with its files
+        
+        Args:
+            job_id (str): Job ID returned by submit_job
             
-    except PermissionError:
-        print(f"Error: Permission denied when accessing {excel_path}. Make sure the file is not open in another program.")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error processing Excel file: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        Returns:
+            bytes: Contents of the processed workbook, or None if the job does not exist or is not done
+        """
+        with self.jobs_lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != 'done':
+                return None
+            del self.jobs[job_id]
+        with open(job['path'], 'rb') as f:
+            data = f.read()
+        self._remove_job_files(job)
+        return data
+    
+    def _expire_jobs(self):
+        now = time.monotonic()
+        with self.jobs_lock:
+            expired = [job for job in self.jobs.values() if job['expires'] is not None and job['expires'] <= now]
+            for job in expired:
+                del self.jobs[job['id']]
+        for job in expired:
+            logger.info(f"Removing expired workbook job {job['id']}", extra={'job': job['id']})
+            self._remove_job_files(job)
+    
+    def _remove_job_files(self, job):
+        # The workbook, its backup and the journals written next to it by process_excel_file
+        for suffix in ('', '.bak', '.journal', '.apply.jsonl'):
+            try:
+                os.remove(job['path'] + suffix)
+            except FileNotFoundError:
+                pass
+
+class LocationRequestHandler(BaseHTTPRequestHandler):
+    """HTTP/JSON front end of the LocationService attached to the server"""
+    
+    # Keep connections open between checks and send small responses straight away
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+    
+    def _send(self, status, body, content_type='application/json'):
+        if content_type == 'application/json':
+            body = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_body(self, max_size):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > max_size:
+            return None
+        return self.rfile.read(length) if length > 0 else b''
+    
+    def do_GET(self):
+        self._dispatch(self._handle_get)
+    
+    def do_POST(self):
+        self._dispatch(self._handle_post)
+    
+    def _dispatch(self, handler):
+        try:
+            handler()
+        except Exception as e:
+            # Answer with an error instead of dropping the connection
+            logger.exception(f"Error handling {self.command} {self.path}: {str(e)}")
+            self.close_connection = True
+            try:
+                self._send(500, {'error': f"internal error: {str(e)}"})
+            except OSError:
+                pass
+    
+    def _handle_get(self):
+        service = self.server.service
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if parts == ['health']:
+            self._send(200, service.health())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            status = service.job_status(parts[1])
+            if status is None:
+                self._send(404, {'error': f"no job {parts[1]}"})
+            else:
+                self._send(200, status)
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+            status = service.job_status(parts[1])
+            data = service.job_result(parts[1])
+            if status is None:
+                self._send(404, {'error': f"no job {parts[1]}"})
+            elif data is None:
+                self._send(409, {'error': f"job {parts[1]} is {status['status']}"})
+            else:
+                self._send(200, data, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        else:
+            self._send(404, {'error': f"unknown path {self.path}"})
+    
+    def _handle_post(self):
+        service = self.server.service
+        path = urlparse(self.path).path.rstrip('/')
+        body = self._read_body(service.max_upload_size)
+        if body is None:
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            self._send(413, {'error': f"the request body is larger than {service.max_upload_size} bytes"})
+            return
+        if path == '/jobs':
+            # .xlsx workbooks are zip archives
+            if not body.startswith(b'PK'):
+                self._send(400, {'error': "the request body must be an .xlsx workbook"})
+                return
+            self._send(202, service.submit_job(body))
+            return
+        if path not in ('/check', '/check/batch'):
+            self._send(404, {'error': f"unknown path {self.path}"})
+            return
+        
+        try:
+            query = json.loads(body)
+        except ValueError:
+            self._send(400, {'error': "the request body must be JSON"})
+            return
+        try:
+            if path == '/check':
+                self._send(200, service.check(query))
+            elif not isinstance(query, Mapping) or not isinstance(query.get('devices'), list):
+                self._send(400, {'error': "a batch check must be an object with a 'devices' list"})
+            else:
+                self._send(200, {'results': service.check_many(query['devices'])})
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+
+def serve(service, host='127.0.0.1', port=8080):
+    """
+    Run the service behind a local HTTP/JSON endpoint until interrupted or terminated
+    
+    Args:
+        service (LocationService): Service answering the requests; closed on shutdown
+        host (str): Address to listen on
+        port (int): Port to listen on
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), LocationRequestHandler)
+    except OSError as e:
+        logger.error(f"Error: Could not listen on {host}:{port}: {e}")
+        service.close()
         sys.exit(1)
+    server.daemon_threads = True
+    server.service = service
+    
+    # Shut down cleanly on SIGTERM as well as Ctrl+C
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        logger.info("Building device index...")
+        service.start()
+        logger.info(f"Serving location checks on http://{host}:{server.server_port}")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        service.close()
 
 def main():
     """Main function to parse arguments and run the script"""
     parser = argparse.ArgumentParser(description='SNMP Location Lookup Tool')
-    parser.add_argument('--excel', required=True, help='Path to the Excel file')
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument('--excel', help='Path to the Excel file')
+    input_group.add_argument('--input', help='Path to the input file (.xlsx, .csv, .parquet or .jsonl)')
+    input_group.add_argument('--serve', action='store_true',
+                             help='Run as a service answering compliance checks over HTTP from a warm device index')
+    parser.add_argument('--output',
+                        help='Path to the output file for CSV/Parquet/JSONL input (.csv, .parquet or .jsonl) '
+                             '(default: <input>.audited with the input extension)')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='Number of rows processed at a time for CSV/Parquet/JSONL input (default: 10000)')
     parser.add_argument('--api-url', required=True, help='LibreNMS API URL (e.g., https://10.1.0.183)')
     parser.add_argument('--api-token', required=True, help='LibreNMS API token')
     parser.add_argument('--location-format', default='$B.$C.$D.$E', 
@@ -545,17 +3081,143 @@ def main():
     parser.add_argument('--domain-suffix', default='.sac.ragingwire.net', help='Domain suffix to append to hostnames')
     parser.add_argument('--device-column', type=int, default=0, 
                         help='Zero-based index of the column containing device names (default: 0, which is column A)')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Fetch the whole device inventory once and look up devices locally')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of concurrent API requests (default: 1)')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Maximum number of API requests per second (default: unlimited)')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='Number of retries for connection errors and 429/5xx API responses (default: 3)')
+    parser.add_argument('--connect-timeout', type=float, default=5,
+                        help='Timeout in seconds for connecting to the API server (default: 5)')
+    parser.add_argument('--read-timeout', type=float, default=30,
+                        help='Timeout in seconds for reading an API response (default: 30)')
+    parser.add_argument('--cache-ttl', type=float, default=0,
+                        help='Cache device records on disk for this many seconds (default: 0, cache disabled)')
+    parser.add_argument('--negative-cache-ttl', type=float, default=300,
+                        help='Cache "not found" results for this many seconds (default: 300)')
+    parser.add_argument('--cache-file', default=DEFAULT_CACHE_FILE,
+                        help=f'Path to the device cache file (default: {DEFAULT_CACHE_FILE})')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignore cached device records and query the API again')
+    parser.add_argument('--delta', action='store_true',
+                        help='Only query devices whose last_polled or location changed since the previous --delta run')
+    parser.add_argument('--snapshot-file', default=DEFAULT_SNAPSHOT_FILE,
+                        help=f'Path to the device snapshot used by --delta (default: {DEFAULT_SNAPSHOT_FILE})')
+    parser.add_argument('--dns-workers', type=int, default=10,
+                        help='Number of concurrent DNS lookups for devices not found in LibreNMS (default: 10)')
+    parser.add_argument('--write-only', action='store_true',
+                        help='Rewrite the workbook in streaming write-only mode (faster for very large sheets)')
+    parser.add_argument('--excel-engine', choices=['openpyxl', 'calamine'], default=None,
+                        help='Engine used to read the workbook; calamine is faster and requires python-calamine')
+    rerun_group = parser.add_mutually_exclusive_group()
+    rerun_group.add_argument('--resume', action='store_true',
+                             help='Resume an interrupted run, skipping devices already recorded in the checkpoint journal')
+    rerun_group.add_argument('--incremental', action='store_true',
+                             help='Only query devices whose name or location columns changed since the last run, '
+                                  'or that were not found')
+    parser.add_argument('--apply', action='store_true',
+                        help='Set the location of non-compliant devices in LibreNMS to the expected location')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='With --apply, only log and journal the location updates that would be made')
+    parser.add_argument('--apply-near-misses', action='store_true',
+                        help='With --apply, also update devices whose location is a normalized or fuzzy match')
+    parser.add_argument('--apply-batch-size', type=int, default=100,
+                        help='Number of location updates sent before progress is reported (default: 100)')
+    parser.add_argument('--abbreviation', action='append', default=[], metavar='SHORT=LONG',
+                        help='Treat SHORT and LONG as the same location token, e.g. RM=ROOM (can be repeated)')
+    parser.add_argument('--fuzzy-threshold', type=float, default=0.8,
+                        help='Minimum similarity (0-1) for a non-compliant location to be reported as a fuzzy match (default: 0.8)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Number of worker processes used to read sheets in parallel (default: 1)')
+    parser.add_argument('--listen', default='127.0.0.1:8080',
+                        help='Address and port the --serve endpoint listens on (default: 127.0.0.1:8080)')
+    parser.add_argument('--index-refresh', type=float, default=300,
+                        help='Seconds between device inventory refreshes in --serve mode (default: 300, 0 disables)')
+    parser.add_argument('--job-retention', type=float, default=3600,
+                        help='Seconds a finished --serve job is kept if its result is not downloaded (default: 3600)')
+    parser.add_argument('--max-upload-size', type=float, default=100,
+                        help='Maximum size in MB of a request body in --serve mode (default: 100)')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        help='Minimum level of log messages to print (default: INFO)')
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text',
+                        help='Print log messages as plain text or as one JSON object per line (default: text)')
     
     args = parser.parse_args()
+    configure_logging(args.log_level, json_format=args.log_format == 'json')
+    if args.dry_run and not args.apply:
+        parser.error("--dry-run requires --apply")
+    if args.apply_near_misses and not args.apply:
+        parser.error("--apply-near-misses requires --apply")
+    
+    abbreviations = {}
+    for abbreviation in args.abbreviation:
+        short, separator, long = abbreviation.partition('=')
+        if not separator or not short.strip() or not long.strip():
+            parser.error(f"--abbreviation must look like SHORT=LONG, got '{abbreviation}'")
+        abbreviations[short.strip()] = long.strip()
+    
+    # Service mode keeps the device index warm and answers checks until interrupted
+    if args.serve:
+        host, _, port = args.listen.rpartition(':')
+        if not host or not port.isdigit():
+            parser.error(f"--listen must look like HOST:PORT, got '{args.listen}'")
+        if args.apply:
+            parser.error("--apply cannot be used with --serve")
+        client = create_client(args.api_url, args.api_token, workers=args.workers, rate_limit=args.rate_limit,
+                               retries=args.retries, connect_timeout=args.connect_timeout,
+                               read_timeout=args.read_timeout, cache_file=args.cache_file, cache_ttl=args.cache_ttl,
+                               negative_cache_ttl=args.negative_cache_ttl, refresh=args.refresh)
+        matcher = LocationMatcher(args.location_format, abbreviations, args.fuzzy_threshold)
+        job_options = {'workers': args.workers, 'dns_workers': args.dns_workers, 'write_only': args.write_only,
+                       'excel_engine': args.excel_engine, 'processes': args.processes,
+                       'abbreviations': abbreviations, 'fuzzy_threshold': args.fuzzy_threshold}
+        service = LocationService(client, args.location_format, args.domain_suffix, args.device_column,
+                                  matcher=matcher, resolver=DNSResolver(args.dns_workers), workers=args.workers,
+                                  refresh_interval=args.index_refresh, job_options=job_options,
+                                  job_retention=args.job_retention,
+                                  max_upload_size=int(args.max_upload_size * 1024 * 1024))
+        serve(service, host, int(port))
+        return
+    
+    # CSV, Parquet and JSONL inventories are streamed to a separate output file
+    if args.input and detect_file_format(args.input) != 'excel':
+        output = args.output
+        if not output:
+            stem, extension = os.path.splitext(args.input)
+            output = f"{stem}.audited{extension}"
+        process_table_file(args.input, output, args.api_url, args.api_token, args.location_format, args.domain_suffix,
+                           args.device_column, chunk_size=args.chunk_size, bulk=args.bulk, workers=args.workers,
+                           rate_limit=args.rate_limit, retries=args.retries, connect_timeout=args.connect_timeout,
+                           read_timeout=args.read_timeout, cache_file=args.cache_file, cache_ttl=args.cache_ttl,
+                           negative_cache_ttl=args.negative_cache_ttl, refresh=args.refresh,
+                           dns_workers=args.dns_workers, abbreviations=abbreviations,
+                           fuzzy_threshold=args.fuzzy_threshold, delta=args.delta, snapshot_file=args.snapshot_file,
+                           apply=args.apply, dry_run=args.dry_run, apply_batch_size=args.apply_batch_size,
+                           apply_near_misses=args.apply_near_misses)
+        return
+    
+    args.excel = args.excel or args.input
+    if args.output:
+        logger.warning("Warning: --output is ignored for Excel files, which are updated in place")
     
     # Validate arguments
     if not args.excel.endswith(('.xlsx', '.xls')):
-        print("Warning: The specified file does not have an Excel extension (.xlsx or .xls)")
+        logger.warning("Warning: The specified file does not have an Excel extension (.xlsx or .xls)")
         response = input("Continue anyway? (y/n): ")
         if response.lower() != 'y':
             sys.exit(0)
     
-    process_excel_file(args.excel, args.api_url, args.api_token, args.location_format, args.domain_suffix, args.device_column)
+    process_excel_file(args.excel, args.api_url, args.api_token, args.location_format, args.domain_suffix, args.device_column,
+                       bulk=args.bulk, workers=args.workers, rate_limit=args.rate_limit, retries=args.retries,
+                       connect_timeout=args.connect_timeout, read_timeout=args.read_timeout,
+                       cache_file=args.cache_file, cache_ttl=args.cache_ttl, negative_cache_ttl=args.negative_cache_ttl,
+                       refresh=args.refresh, dns_workers=args.dns_workers, write_only=args.write_only,
+                       excel_engine=args.excel_engine, resume=args.resume, incremental=args.incremental,
+                       processes=args.processes, abbreviations=abbreviations, fuzzy_threshold=args.fuzzy_threshold,
+                       delta=args.delta, snapshot_file=args.snapshot_file, apply=args.apply, dry_run=args.dry_run,
+                       apply_batch_size=args.apply_batch_size, apply_near_misses=args.apply_near_misses)
 
 if __name__ == "__main__":
     main()
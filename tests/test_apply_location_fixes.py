@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snmp_location_lookup import ApplyJournal, apply_location_fixes, collect_location_fixes, read_sheets
+
+
+class FakeClient:
+    """Records location updates instead of sending them to LibreNMS"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.updates = []
+
+    def update_device_location(self, hostname, location, device=None):
+        self.updates.append((hostname, location))
+        if hostname in self.failing:
+            return False, "status code 500: Internal Server Error"
+        return True, "Device location updated"
+
+
+def run_fixes(tmp_path, targets, devices, client=None, **options):
+    client = client or FakeClient()
+    journal = ApplyJournal(str(tmp_path / 'apply.jsonl'))
+    counts = apply_location_fixes(client, targets, devices, journal, **options)
+    journal.close()
+    with open(journal.path) as f:
+        records = {record['hostname']: record for record in map(json.loads, f)}
+    return client, counts, records
+
+
+def test_updates_mismatched_and_reordered_locations(tmp_path):
+    devices = {'a.example.com': {'location': 'CA2.R1.X.Y'}, 'b.example.com': {'location': 'CA2.Y.X.R2'}}
+    targets = {'a.example.com': {'CA2.R9.X.Y': 'mismatch'}, 'b.example.com': {'CA2.R2.X.Y': 'reordered'}}
+
+    client, counts, records = run_fixes(tmp_path, targets, devices, workers=2)
+
+    assert sorted(client.updates) == [('a.example.com', 'CA2.R9.X.Y'), ('b.example.com', 'CA2.R2.X.Y')]
+    assert counts == {'updated': 2, 'failed': 0, 'skipped': 0, 'dry-run': 0}
+    assert records['a.example.com']['old'] == 'CA2.R1.X.Y'
+    assert records['a.example.com']['new'] == 'CA2.R9.X.Y'
+    assert records['a.example.com']['status'] == 'updated'
+
+
+def test_skips_near_misses_unless_requested(tmp_path):
+    devices = {'a.example.com': {'location': 'CA2.R1.X.Y'}, 'b.example.com': {'location': 'ca2-r2-x-y'}}
+    targets = {'a.example.com': {'CA2.1.X.Y': 'fuzzy'}, 'b.example.com': {'CA2.R2.X.Y': 'normalized'}}
+
+    client, counts, records = run_fixes(tmp_path, targets, devices)
+
+    assert client.updates == []
+    assert counts['skipped'] == 2
+    assert records['a.example.com']['status'] == 'skipped'
+    assert records['a.example.com']['new'] == 'CA2.1.X.Y'
+    assert 'fuzzy' in records['a.example.com']['message']
+
+    client, counts, records = run_fixes(tmp_path, targets, devices, near_misses=True)
+
+    assert sorted(client.updates) == [('a.example.com', 'CA2.1.X.Y'), ('b.example.com', 'CA2.R2.X.Y')]
+    assert counts['updated'] == 2
+
+
+def test_skips_devices_whose_rows_disagree(tmp_path):
+    devices = {'a.example.com': {'location': 'CA2.R1.X.Y'}}
+    targets = {'a.example.com': {'CA2.R2.X.Y': 'mismatch', 'CA2.R3.X.Y': 'mismatch'}}
+
+    client, counts, records = run_fixes(tmp_path, targets, devices)
+
+    assert client.updates == []
+    assert counts['skipped'] == 1
+    assert records['a.example.com']['new'] is None
+    assert 'CA2.R2.X.Y, CA2.R3.X.Y' in records['a.example.com']['message']
+
+
+def test_dry_run_sends_nothing(tmp_path):
+    devices = {'a.example.com': {'location': 'CA2.R1.X.Y'}}
+    targets = {'a.example.com': {'CA2.R9.X.Y': 'mismatch'}}
+
+    client, counts, records = run_fixes(tmp_path, targets, devices, dry_run=True)
+
+    assert client.updates == []
+    assert counts['dry-run'] == 1
+    assert records['a.example.com']['status'] == 'dry-run'
+
+
+def test_failed_updates_are_journaled(tmp_path):
+    devices = {f'{name}.example.com': {'location': 'OLD'} for name in 'abc'}
+    targets = {hostname: {'NEW': 'mismatch'} for hostname in devices}
+
+    client, counts, records = run_fixes(tmp_path, targets, devices, client=FakeClient(['b.example.com']),
+                                        workers=3, batch_size=2)
+
+    assert counts == {'updated': 2, 'failed': 1, 'skipped': 0, 'dry-run': 0}
+    assert records['b.example.com']['status'] == 'failed'
+    assert '500' in records['b.example.com']['message']
+
+
+def test_collected_fixes_keep_the_match_class_per_device(tmp_path):
+    df = pd.DataFrame({
+        'Device': ['a', 'A', 'b', 'c'],
+        'Expected_Location': ['CA2.R9.X.Y', 'CA2.R9.X.Y', 'CA2.1.X.Y', 'CA2.R3.X.Y'],
+        'Compliant': ['No', 'No', 'No', 'Yes'],
+        'Match': ['mismatch', 'mismatch', 'fuzzy', 'exact'],
+    })
+    row_hostnames = pd.Series(['a.example.com', 'A.example.com', 'b.example.com', 'c.example.com'])
+
+    targets = {}
+    collect_location_fixes(df, row_hostnames, targets)
+
+    assert targets == {'a.example.com': {'CA2.R9.X.Y': 'mismatch'}, 'b.example.com': {'CA2.1.X.Y': 'fuzzy'}}
+
+
+def test_expected_locations_keep_leading_zeros_of_text_cells(tmp_path):
+    path = str(tmp_path / 'audit.xlsx')
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = 'IDF'
+    worksheet.append(['Device', 'Site', 'Room', 'Rack', 'Position'])
+    worksheet.append(['dev1', 'CA2', '01', '007', 'Y'])
+    worksheet.append(['dev2', 'CA2', 2, '08', 'Y'])
+    workbook.save(path)
+
+    [(sheet_name, df, row_hostnames, expected_locations, keep_columns)] = read_sheets(
+        path, ['IDF'], None, 0, '$B.$C.$D.$E', '.example.com')
+
+    assert list(expected_locations) == ['CA2.01.007.Y', 'CA2.2.08.Y']
+    assert df.at[1, 'Room'] == 2